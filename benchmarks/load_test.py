@@ -0,0 +1,378 @@
+"""
+Load-test the Streamlit app with concurrent scripted sessions.
+
+Usage (from the repo root):
+    python -m benchmarks.load_test --sessions 20
+    python -m benchmarks.load_test --sessions 50 --scale 10 --think 1.0
+    python -m benchmarks.load_test --sessions 20 --save load.json
+    python -m benchmarks.load_test --sessions 20 --compare load.json
+    python -m benchmarks.load_test --url http://localhost:8501 --pid 1234
+
+Starts `streamlit run pumpplaylist.py` on a free local port, unless --url
+points at a running server. Then it opens --sessions websocket sessions at
+once, the way browsers do, and walks each through an instructor's flow:
+
+    open -> pick_release -> build_random -> swap -> theme_tags ->
+    build_theme -> search -> add_track
+
+Every step sends the widget states a browser would send and waits for the
+script (or fragment) run to finish. The report shows rerun latency
+percentiles per step and for all steps. When the server's pid is known
+(the server was started here, or --pid was given), it also shows the
+server's CPU time and RSS, overall and per session. CPU and RSS come from
+/proc, so they are Linux only. --compare exits non-zero if a step's p95
+is more than --threshold slower than a saved run.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+from benchmarks.synthetic import generate_catalog, to_encoded_csv
+from catalog_loader import encoded_csv_from_file
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+APP = REPO_ROOT / "pumpplaylist.py"
+
+STEPS = ["open", "pick_release", "build_random", "swap", "theme_tags", "build_theme", "search", "add_track"]
+SEARCH_TERMS = ["love", "pink", "night", "dance", "heart"]
+WIDGET_ID = re.compile(r"^\$\$ID-[0-9a-f]+-(.*)$")  # user key at the end of a widget id
+STEP_TIMEOUT = 120  # seconds one rerun may take before the session gives up
+STDERR_TAIL_LINES = 20  # server log lines shown when it fails to start
+
+
+# -------- One scripted browser session --------
+class Session:
+    """A websocket session that tracks widgets and sends their states like the browser does."""
+
+    def __init__(self, url, number, rng):
+        self.url = url
+        self.number = number
+        self.rng = rng
+        self.widgets = {}  # user key -> (widget id, element type, element proto, fragment id)
+        self.states = {}  # widget id -> WidgetState, resent on every rerun
+        self.latencies = {}  # step -> seconds
+        self.errors = []
+
+    async def rerun(self, ws, step, change=None, fragment_id=""):
+        msg = BackMsg()
+        msg.rerun_script.query_string = f"profile=loadtest{self.number:04d}"
+        msg.rerun_script.page_script_hash = ""
+        if fragment_id:
+            msg.rerun_script.fragment_id = fragment_id
+        states = dict(self.states)
+        if change is not None:
+            if change.WhichOneof("value") != "trigger_value":
+                self.states[change.id] = change
+            states[change.id] = change
+        msg.rerun_script.widget_states.widgets.extend(states.values())
+
+        start = time.perf_counter()
+        await ws.send(msg.SerializeToString())
+        if not fragment_id:
+            self.widgets = {}
+        while True:
+            fm = ForwardMsg()
+            fm.ParseFromString(await asyncio.wait_for(ws.recv(), STEP_TIMEOUT))
+            kind = fm.WhichOneof("type")
+            if kind == "delta" and fm.delta.WhichOneof("type") == "new_element":
+                self._see(fm.delta.new_element, fm.delta.fragment_id, step)
+            elif kind == "script_finished":
+                if fm.script_finished == ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    continue
+                break
+        self.latencies[step] = time.perf_counter() - start
+
+    def _see(self, element, fragment_id, step):
+        kind = element.WhichOneof("type")
+        if kind == "exception":
+            self.errors.append(f"{step}: {element.exception.type}: {element.exception.message}")
+            return
+        widget = getattr(element, kind)
+        match = WIDGET_ID.match(getattr(widget, "id", "") or "")
+        if match:
+            self.widgets[match.group(1)] = (widget.id, kind, widget, fragment_id)
+
+    def state(self, key, **value):
+        widget_id = self.widgets[key][0]
+        state = WidgetState(id=widget_id, **value)
+        return state
+
+    def click(self, key):
+        return self.state(key, trigger_value=True), self.widgets[key][3]
+
+    async def run(self, ws, think):
+        async def step(name, change=None, fragment_id=""):
+            if think:
+                await asyncio.sleep(self.rng.uniform(0, think))
+            await self.rerun(ws, name, change, fragment_id)
+
+        await step("open")
+        releases = list(self.widgets["early_release"][2].options)
+        # Most instructors own a good share of the back catalog
+        release = self.rng.choice(releases[: max(1, len(releases) // 2)])
+        await step("pick_release", self.state("early_release", string_value=release))
+        await step("build_random", *self.click("build_random"))
+        swaps = [key for key in self.widgets if key.startswith("swap_random_")]
+        if swaps:
+            await step("swap", *self.click(self.rng.choice(swaps)))
+        tags = list(self.widgets["theme_tags"][2].options)
+        picked = self.rng.sample(tags, k=min(2, len(tags)))
+        await step("theme_tags", self.state("theme_tags", string_array_value={"data": picked}))
+        await step("build_theme", *self.click("build_theme"))
+        term = self.rng.choice(SEARCH_TERMS)
+        await step("search", self.state("custom_search", string_value=term))
+        adds = [key for key in self.widgets if key.startswith("add_search_")]
+        if adds:
+            await step("add_track", *self.click(adds[0]))
+
+
+async def run_sessions(url, sessions, think, ramp, seed):
+    ws_url = url.replace("http", "ws", 1).rstrip("/") + "/_stcore/stream"
+
+    async def one(number):
+        session = Session(ws_url, number, random.Random(seed + number))
+        await asyncio.sleep(ramp * number / max(1, sessions))
+        try:
+            async with websockets.connect(ws_url, subprotocols=["streamlit"], max_size=None) as ws:
+                await session.run(ws, think)
+        except Exception as e:  # keep the other sessions going
+            session.errors.append(f"{type(e).__name__}: {e}")
+        return session
+
+    return await asyncio.gather(*(one(number) for number in range(sessions)))
+
+
+# -------- Server process --------
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_healthy(url, timeout=60, process=None):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"server exited with code {process.returncode}")
+        try:
+            with urllib.request.urlopen(f"{url}/_stcore/health", timeout=2) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            time.sleep(0.3)
+    raise RuntimeError(f"server at {url} did not come up within {timeout}s")
+
+
+def start_server(encoded_csv, workdir):
+    """Run the app headless on a free port; returns (process, url)."""
+    secrets = Path(workdir) / "secrets.toml"
+    secrets.write_text(f'csv_data = "{encoded_csv}"\n')
+    port = free_port()
+    env = {**os.environ, "PUMP_DB_PATH": str(Path(workdir) / "playlists.db")}
+    # stderr goes to a file: an unread pipe fills up and blocks the server
+    log_path = Path(workdir) / "server.log"
+    with open(log_path, "wb") as log:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "streamlit", "run", str(APP),
+             "--server.headless", "true", "--server.port", str(port),
+             "--browser.gatherUsageStats", "false", "--secrets.files", str(secrets)],
+            cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=log,
+        )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        wait_healthy(url, process=process)
+    except RuntimeError as e:
+        process.terminate()
+        process.wait(10)
+        tail = log_path.read_text(errors="replace").splitlines()[-STDERR_TAIL_LINES:]
+        raise RuntimeError(f"{e}; server stderr:\n" + "\n".join(tail)) from None
+    return process, url
+
+
+def process_usage(pid):
+    """(CPU seconds, RSS MiB) of a process from /proc, or None where that isn't available."""
+    try:
+        stat = Path(f"/proc/{pid}/stat").read_text()
+        status = Path(f"/proc/{pid}/status").read_text()
+    except OSError:
+        return None
+    fields = stat.rsplit(")", 1)[1].split()
+    cpu = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")  # utime + stime
+    rss_kb = int(re.search(r"VmRSS:\s+(\d+)", status).group(1))
+    return cpu, rss_kb / 1024
+
+
+async def sample_rss(pid, peak, stop):
+    while not stop.is_set():
+        usage = process_usage(pid)
+        if usage:
+            peak[0] = max(peak[0], usage[1])
+        await asyncio.sleep(0.2)
+
+
+# -------- Report --------
+def percentiles(values):
+    values = sorted(values)
+    if not values:
+        return {}
+
+    def at(p):
+        return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+    return {
+        "count": len(values),
+        "p50_ms": at(50) * 1000,
+        "p90_ms": at(90) * 1000,
+        "p95_ms": at(95) * 1000,
+        "p99_ms": at(99) * 1000,
+        "max_ms": values[-1] * 1000,
+        "mean_ms": statistics.fmean(values) * 1000,
+    }
+
+
+async def load_test(args):
+    pid = args.pid
+    process = None
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.url:
+            url = args.url.rstrip("/")
+        else:
+            encoded = (encoded_csv_from_file(args.data) if args.data
+                       else to_encoded_csv(generate_catalog(args.scale, args.seed)))
+            process, url = start_server(encoded, workdir)
+            pid = process.pid
+        try:
+            # One warm-up session loads the catalog and imports, so the
+            # numbers below are steady state
+            warmup = (await run_sessions(url, 1, 0, 0, args.seed - 1))[0]
+            if warmup.errors:
+                raise RuntimeError(f"warm-up session failed: {warmup.errors}")
+            before = process_usage(pid) if pid else None
+            peak = [before[1] if before else 0.0]
+            stop = asyncio.Event()
+            sampler = asyncio.create_task(sample_rss(pid, peak, stop)) if before else None
+
+            start = time.perf_counter()
+            sessions = await run_sessions(url, args.sessions, args.think, args.ramp, args.seed)
+            wall = time.perf_counter() - start
+
+            after = process_usage(pid) if pid else None
+            stop.set()
+            if sampler:
+                await sampler
+        finally:
+            if process:
+                process.terminate()
+                process.wait(10)
+
+    report = {
+        "sessions": args.sessions,
+        "wall_s": wall,
+        "reruns": sum(len(s.latencies) for s in sessions),
+        "errors": [f"session {s.number}: {error}" for s in sessions for error in s.errors],
+        "steps": {step: percentiles([s.latencies[step] for s in sessions if step in s.latencies])
+                  for step in STEPS},
+        "all": percentiles([t for s in sessions for t in s.latencies.values()]),
+    }
+    if before and after:
+        cpu = after[0] - before[0]
+        report["server"] = {
+            "cpu_s": cpu,
+            "cpu_s_per_session": cpu / args.sessions,
+            "cpu_utilization": cpu / wall,  # 1.0 = one core busy for the whole run
+            "rss_before_mib": before[1],
+            "rss_peak_mib": peak[0],
+            "rss_after_mib": after[1],
+            "rss_mib_per_session": (after[1] - before[1]) / args.sessions,
+        }
+    return report
+
+
+def print_report(report):
+    print(f"\n{report['sessions']} sessions, {report['reruns']} reruns in {report['wall_s']:.1f} s")
+    print(f"  {'step':14s} {'n':>4s} {'p50':>9s} {'p90':>9s} {'p95':>9s} {'p99':>9s} {'max':>9s}  (ms)")
+    for step, stats in [*report["steps"].items(), ("all", report["all"])]:
+        if stats:
+            print(f"  {step:14s} {stats['count']:4d} {stats['p50_ms']:9.1f} {stats['p90_ms']:9.1f} "
+                  f"{stats['p95_ms']:9.1f} {stats['p99_ms']:9.1f} {stats['max_ms']:9.1f}")
+    server = report.get("server")
+    if server:
+        print(f"\n  server CPU {server['cpu_s']:.1f} s ({server['cpu_s_per_session']:.2f} s/session, "
+              f"{server['cpu_utilization']:.0%} of one core)")
+        print(f"  server RSS {server['rss_before_mib']:.0f} -> {server['rss_after_mib']:.0f} MiB "
+              f"(peak {server['rss_peak_mib']:.0f}, {server['rss_mib_per_session']:.1f} MiB/session)")
+    if report["errors"]:
+        print(f"\n  {len(report['errors'])} errors:")
+        for error in report["errors"][:10]:
+            print(f"    {error}")
+
+
+def compare(report, baseline, threshold):
+    """Print p95 ratios per step against a saved run; return the regressed steps."""
+    regressions = []
+    print(f"\nComparison against baseline p95 (threshold +{threshold:.0%}):")
+    for step, stats in [*report["steps"].items(), ("all", report["all"])]:
+        base = baseline["all"] if step == "all" else baseline["steps"].get(step)
+        if not stats or not base:
+            continue
+        ratio = stats["p95_ms"] / base["p95_ms"] if base["p95_ms"] else float("inf")
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressions.append(step)
+        print(f"  {step:14s} {ratio:6.2f}x{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=10, help="concurrent sessions")
+    parser.add_argument("--think", type=float, default=0.5,
+                        help="max seconds a session pauses before each step (uniform random)")
+    parser.add_argument("--ramp", type=float, default=2.0, help="seconds over which sessions connect")
+    parser.add_argument("--data", help="catalog CSV or base64 csv_data text (default: synthetic catalog)")
+    parser.add_argument("--scale", type=float, default=1, help="synthetic catalog size vs the real one")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--url", help="test a running server instead of starting one")
+    parser.add_argument("--pid", type=int, help="pid of the --url server, for CPU and RSS")
+    parser.add_argument("--save", help="write the report to this JSON file")
+    parser.add_argument("--compare", help="saved report to compare p95 latencies against")
+    parser.add_argument("--threshold", type=float, default=0.5,
+                        help="allowed p95 slowdown before a step counts as a regression")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(load_test(args))
+    print_report(report)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"\nSaved report to {args.save}")
+
+    failed = bool(report["errors"])
+    if args.compare:
+        with open(args.compare) as f:
+            failed |= bool(compare(report, json.load(f), args.threshold))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
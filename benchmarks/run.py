@@ -0,0 +1,169 @@
+"""
+Benchmark the catalog, search and generation hot paths headlessly.
+
+Usage (from the repo root):
+    python -m benchmarks.run                          # scales 1x and 10x
+    python -m benchmarks.run --scales 1 10 100
+    python -m benchmarks.run --save benchmarks/baseline.json
+    python -m benchmarks.run --compare benchmarks/baseline.json
+
+Each operation is timed over --repeat runs (after one warmup) and then run
+once more under tracemalloc for peak memory. --compare exits non-zero if any
+operation's best time is more than --threshold slower than the baseline, and
+lists operations the baseline doesn't have.
+
+Timings only compare on the machine that recorded them, so the baseline is
+not checked in (benchmarks/baseline.json is git-ignored). Record one locally
+with --save on the commit you are starting from, then --compare after the
+change.
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import generate_catalog, to_encoded_csv
+from catalog_validation import validate_catalog
+from playlist_engine import (
+    apply_search_filter, build_catalog, build_duration_playlist, build_random_playlist, build_theme_playlist,
+    filter_release_window, similar_tracks, similarity_index, slot_counts, theme_index, theme_mask,
+)
+
+
+# Every soft preference and cross-slot rule switched on
+PREFERENCES = {"recency": 2.0, "genre_mix": {"Pop": 0.5, "Rock": 0.3, "EDM": 0.2},
+               "difficulty": "Hard", "max_per_release": 1, "unique_artist": True}
+
+
+def operations(scale: float, seed: int):
+    """Return [(name, fn)] for one catalog size. Setup cost is not timed."""
+    encoded = to_encoded_csv(generate_catalog(scale, seed))
+    catalog = build_catalog(encoded)
+    early_release = str(catalog['Release'].iloc[0])
+    window = filter_release_window(catalog, early_release)
+    index = theme_index(window)
+    themed = window[theme_mask(index, ["Halloween", "Summer"], ["Hard"], [])]
+    similarity = similarity_index(catalog)
+    slot_pool = window[window['Track No#'] == window['Track No#'].iloc[0]]
+    track_id = slot_pool['TrackID'].iloc[0]
+
+    return [
+        ("load_data", lambda: build_catalog(encoded)),
+        ("validate_catalog", lambda: validate_catalog(catalog)),
+        ("filter_release_window", lambda: filter_release_window(catalog, early_release, True, True)),
+        ("apply_search_filter[word]", lambda: apply_search_filter(window, "pink")),
+        ("apply_search_filter[words]", lambda: apply_search_filter(window, "wild heart")),
+        ("theme_index", lambda: theme_index(window)),
+        ("theme_mask", lambda: theme_mask(index, ["Halloween", "Summer"], ["Hard"], [])),
+        ("similarity_index", lambda: similarity_index(catalog)),
+        ("similar_tracks", lambda: similar_tracks(similarity, slot_pool, track_id)),
+        ("slot_counts", lambda: slot_counts(index, theme_mask(index, ["Halloween", "Summer"], ["Hard"], ["Rock"]))),
+        ("build_random_playlist", lambda: build_random_playlist(window)),
+        ("build_theme_playlist", lambda: build_theme_playlist(themed)),
+        ("build_random_playlist[prefs]", lambda: build_random_playlist(window, PREFERENCES)),
+        ("build_duration_playlist", lambda: build_duration_playlist(window, 55 * 60)),
+    ], len(catalog)
+
+
+def measure(fn, repeat: int):
+    fn()  # warmup
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "median_s": statistics.median(times),
+        "min_s": min(times),
+        "peak_mib": peak / 2**20,
+    }
+
+
+def run(scales, repeat: int, seed: int):
+    results = {}
+    for scale in scales:
+        ops, rows = operations(scale, seed)
+        label = f"{scale:g}x"
+        print(f"\n[{label}] {rows} rows")
+        results[label] = {}
+        for name, fn in ops:
+            result = measure(fn, repeat)
+            results[label][name] = result
+            print(f"  {name:28s} median {result['median_s'] * 1000:9.2f} ms  "
+                  f"min {result['min_s'] * 1000:9.2f} ms  peak {result['peak_mib']:8.2f} MiB")
+    return results
+
+
+def compare(results, baseline, threshold: float):
+    """Print best-time ratios against a baseline; return the regressed operations."""
+    regressions = []
+    print(f"\nComparison against baseline (threshold +{threshold:.0%}):")
+    for label, ops in results.items():
+        for name, result in ops.items():
+            base = baseline.get(label, {}).get(name)
+            if not base:
+                # Not a regression, but the baseline needs re-saving to cover it
+                print(f"  [{label}] {name:28s}    new  (not in baseline)")
+                continue
+            ratio = result["min_s"] / base["min_s"] if base["min_s"] else float("inf")
+            flag = ""
+            if ratio > 1 + threshold:
+                flag = "  REGRESSION"
+                regressions.append(f"{label} {name}")
+            print(f"  [{label}] {name:28s} {ratio:6.2f}x{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=float, nargs="+", default=[1, 10],
+                        help="catalog sizes as multiples of the real catalog")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed slowdown before an operation counts as a regression")
+    args = parser.parse_args(argv)
+
+    results = run(args.scales, args.repeat, args.seed)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({
+                "meta": {
+                    "python": platform.python_version(),
+                    "pandas": pd.__version__,
+                    "numpy": np.__version__,
+                    "machine": platform.machine(),
+                    "repeat": args.repeat,
+                    "seed": args.seed,
+                },
+                "results": results,
+            }, f, indent=2)
+            f.write("\n")
+        print(f"\nSaved results to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
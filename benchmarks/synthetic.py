@@ -0,0 +1,238 @@
+"""
+Synthetic catalogs in the real CSV schema, for benchmarks and load tests.
+
+The real catalog is ~1,350 rows (about 136 releases of 10-14 tracks); `scale`
+multiplies that, or `rows` asks for a size directly. Column distributions
+(genre mix, per-slot durations, tag frequencies, rep counts, bonus tracks,
+recurring artists) follow the real catalog so filters and searches select
+realistic fractions of the rows.
+
+With edge_cases > 0 a fraction of rows is deliberately messy: malformed
+durations, duplicate and alias tags, missing artists/genres, duplicate rows.
+Accented names are always present, so encoding="cp1252" yields bytes that
+are not valid UTF-8 and exercises load_data's fallback decode.
+
+Usage (from the repo root):
+    python -m benchmarks.synthetic --rows 50000 -o big.csv
+    python -m benchmarks.synthetic --rows 50000 --format base64 -o big.txt
+    python -m benchmarks.synthetic --rows 50000 --edge-cases 0.02 --encoding cp1252 \\
+        --format secrets -o .streamlit/secrets.toml
+"""
+
+import argparse
+import base64
+import itertools
+import random
+import sys
+
+import pandas as pd
+
+from playlist_engine import track_types
+
+COLUMNS = ["Release", "Track No#", "Song Title", "Artist", "Rep Count",
+           "Duration", "Genre", "Hard?", "Easy to Learn?", "Tags"]
+
+BASE_RELEASES = 136
+AVG_TRACKS_PER_RELEASE = 10.2
+
+# Share of rows per genre in the real catalog
+GENRE_WEIGHTS = {"Pop": 0.495, "EDM": 0.289, "Rock": 0.119, "Hip-Hop": 0.068,
+                 "Latin": 0.023, "K-Pop": 0.006}
+
+# Mean/std duration in seconds per slot in the real catalog
+SLOT_DURATIONS = {
+    "1 - Warmup": (310, 47), "2 - Squats": (336, 42), "3 - Chest": (312, 47),
+    "4 - Back": (319, 47), "5 - Triceps": (281, 49), "6 - Biceps": (269, 38),
+    "7 - Lunges": (303, 50), "8 - Shoulders": (293, 52), "9 - Core": (250, 48),
+    "10 - Cooldown": (254, 51),
+}
+
+# Share of rows carrying each theme/instructor tag in the real catalog. The
+# length tags are derived from the duration instead.
+TAG_RATES = {
+    "Women of Pop": 0.088, "Sing-Along": 0.086, "Positive Vibes": 0.057,
+    "Valentine's Day": 0.052, "Break-Up Songs": 0.042, "Beast Mode": 0.039,
+    "Easy to Learn": 0.036, "Hard": 0.036, "Emo": 0.028, "Halloween": 0.027,
+    "New Year's Eve": 0.025, "Summer": 0.025, "P!nk": 0.015,
+    # Present in the data but without an emoji in tag_emojis
+    "Spring": 0.039, "Pride": 0.026, "Spicy": 0.023, "Winter": 0.006,
+}
+
+# Share of releases with bonus tracks beyond the 10 slots
+BONUS_TRACKS = {0: 0.81, 1: 0.13, 2: 0.05, 4: 0.01}
+
+# Releases with non-numeric names in the real catalog
+SPECIAL_RELEASES = ["48 Celebration", "United"]
+
+REP_COUNT_RATE = 0.29
+NO_ARTIST_RELEASES = 2  # R1/R2 have no artist data
+
+WORDS = ["Love", "Night", "Fire", "Heart", "Dance", "Pump", "Run", "Light",
+         "Dream", "Wild", "Gold", "Storm", "Rise", "Fever", "Girl", "Lady",
+         "Tonight", "Forever", "Higher", "Stronger", "Break", "Free", "Move",
+         "Crazy", "Party", "Summer", "Sky", "Thunder", "Magic", "Power"]
+NAME_WORDS = ["DJ", "The", "Kings", "Sisters", "Project", "Nova", "Blue",
+              "Velvet", "Echo", "Rebel", "Neon", "Crystal", "Max", "Jay",
+              "Luna", "Ray", "Stone", "Vibe", "Lux", "Sol"]
+# Real recurring artists (kept so searches like "pink" behave realistically)
+# and accented names that encode differently in cp1252 and UTF-8.
+NAMED_ARTISTS = [("P!nk", "Pop"), ("Madonna", "Pop"), ("Cascada", "EDM"),
+                 ("Lady Gaga", "Pop"), ("AC/DC", "Rock"), ("Shakira", "Latin"),
+                 ("Beyoncé", "Pop"), ("Céline Dion", "Pop"), ("Tiësto", "EDM"),
+                 ("Mötley Crüe", "Rock"), ("Sinéad O’Connor", "Pop")]
+ACCENTED_TITLES = ["Café Fiesta", "Déjà Vu", "Señorita", "Naïve", "Don’t Stop"]
+
+MALFORMED_DURATIONS = ["5.30", "5;30", "", "TBD", "4:30:00", "6m20s", "-"]
+TAG_ALIASES = {"Break-Up Songs": "Break-up Songs", "Positive Vibes": "🌈"}
+
+
+def _weighted(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def _artists(rng, count):
+    """Artist pool with genres; a Zipf-like weighting makes some recur a lot.
+
+    Returns cumulative weights so each draw doesn't re-sum the whole pool.
+    """
+    pool = list(NAMED_ARTISTS)
+    while len(pool) < count:
+        name = " ".join(rng.sample(NAME_WORDS, rng.randint(1, 3)))
+        pool.append((name, _weighted(rng, GENRE_WEIGHTS)))
+    weights = (1 / (rank + 1) ** 0.8 for rank in range(len(pool)))
+    return pool, list(itertools.accumulate(weights))
+
+
+def _duration(rng, track):
+    mean, std = SLOT_DURATIONS[track]
+    return max(150, min(450, round(rng.gauss(mean, std))))
+
+
+def generate_catalog(scale: float = 1.0, seed: int = 0, edge_cases: float = 0.0,
+                     rows: int = None):
+    """Return a raw catalog DataFrame (as read from CSV, before cleaning)."""
+    rng = random.Random(seed)
+    target_rows = rows if rows is not None else BASE_RELEASES * AVG_TRACKS_PER_RELEASE * scale
+    releases = max(1, round(target_rows / AVG_TRACKS_PER_RELEASE))
+    artists, artist_cum_weights = _artists(rng, max(len(NAMED_ARTISTS), round(target_rows / 3)))
+
+    # Special releases sit among the numbered ones like they do in the real data
+    names = [str(n) for n in range(1, releases + 1)]
+    for special in SPECIAL_RELEASES:
+        if len(names) > 2:
+            names.insert(rng.randint(2, len(names)), special)
+
+    out = []
+    for release in names:
+        slots = list(track_types)
+        slots += rng.sample(track_types, _weighted(rng, BONUS_TRACKS))
+        for track in slots:
+            artist, genre = rng.choices(artists, cum_weights=artist_cum_weights)[0]
+            if rng.random() < 0.05:
+                genre = _weighted(rng, GENRE_WEIGHTS)
+            if release.isdigit() and int(release) <= NO_ARTIST_RELEASES:
+                artist = None
+            if rng.random() < 0.01:
+                title = rng.choice(ACCENTED_TITLES)
+            else:
+                title = " ".join(rng.sample(WORDS, rng.randint(1, 4)))
+
+            sec = _duration(rng, track)
+            tags = [tag for tag, rate in TAG_RATES.items() if rng.random() < rate]
+            if sec < 270:
+                tags.append("Short (<4:30)")
+            elif sec > 360:
+                tags.append("Long (>6 min)")
+
+            out.append({
+                "Release": release,
+                "Track No#": track,
+                "Song Title": title,
+                "Artist": artist,
+                "Rep Count": rng.randint(40, 200) if rng.random() < REP_COUNT_RATE else None,
+                "Duration": f"{sec // 60}:{sec % 60:02d}",
+                "Genre": genre,
+                "Hard?": "Hard" if "Hard" in tags else None,
+                "Easy to Learn?": "Easy to Learn" if "Easy to Learn" in tags else None,
+                "Tags": ", ".join(tags) if tags else None,
+            })
+
+    if edge_cases > 0:
+        out = _add_edge_cases(rng, out, edge_cases)
+    df = pd.DataFrame(out, columns=COLUMNS)
+    df["Rep Count"] = df["Rep Count"].astype("Int64")
+    return df
+
+
+def _add_edge_cases(rng, out, rate):
+    """Corrupt a fraction of rows; every kind of edge case appears at least once."""
+    kinds = ["duration", "duplicate_tag", "alias_tag", "empty_tag",
+             "no_artist", "no_genre", "duplicate_row"]
+    count = max(len(kinds), round(len(out) * rate))
+    picks = rng.sample(range(len(out)), min(count, len(out)))
+    duplicates = []
+    for n, i in enumerate(picks):
+        row = out[i]
+        kind = kinds[n % len(kinds)]
+        if kind == "duration":
+            row["Duration"] = rng.choice(MALFORMED_DURATIONS)
+        elif kind == "duplicate_tag":
+            tag = _weighted(rng, TAG_RATES)
+            row["Tags"] = ", ".join(filter(None, [row["Tags"], tag, tag]))
+        elif kind == "alias_tag":
+            tag = rng.choice(list(TAG_ALIASES))
+            row["Tags"] = ", ".join(filter(None, [row["Tags"], tag, TAG_ALIASES[tag]]))
+        elif kind == "empty_tag":
+            row["Tags"] = rng.choice(["-", "None", " , "])
+        elif kind == "no_artist":
+            row["Artist"] = None
+        elif kind == "no_genre":
+            row["Genre"] = None
+        elif kind == "duplicate_row":
+            duplicates.append(dict(row))
+    return out + duplicates
+
+
+def to_csv_bytes(df, encoding: str = "utf-8"):
+    # cp1252 can't encode emoji; those tags are replaced, like a spreadsheet export would
+    return df.to_csv(index=False).encode(encoding, errors="replace")
+
+
+def to_encoded_csv(df, encoding: str = "utf-8"):
+    """Encode a catalog the way the csv_data secret is stored."""
+    return base64.b64encode(to_csv_bytes(df, encoding)).decode("ascii")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    size = parser.add_mutually_exclusive_group()
+    size.add_argument("--rows", type=int, help="approximate number of rows")
+    size.add_argument("--scale", type=float, default=1.0, help="multiple of the real catalog size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--edge-cases", type=float, default=0.0,
+                        help="fraction of rows to make deliberately messy (e.g. 0.01)")
+    parser.add_argument("--encoding", choices=["utf-8", "cp1252"], default="utf-8")
+    parser.add_argument("--format", choices=["csv", "base64", "secrets"], default="csv",
+                        help="plain CSV, base64 csv_data value, or a secrets.toml with csv_data")
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    df = generate_catalog(args.scale, args.seed, args.edge_cases, args.rows)
+    if args.format == "csv":
+        data = to_csv_bytes(df, args.encoding)
+    elif args.format == "base64":
+        data = to_encoded_csv(df, args.encoding).encode("ascii")
+    else:
+        data = f'csv_data = "{to_encoded_csv(df, args.encoding)}"\n'.encode("ascii")
+
+    if args.output:
+        with open(args.output, "wb") as f:
+            f.write(data)
+        print(f"Wrote {len(df)} rows ({len(data)} bytes) to {args.output}", file=sys.stderr)
+    else:
+        sys.stdout.buffer.write(data)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""
+Build the catalog off the script thread so the page can render before it's ready.
+
+    loader = CatalogLoader(prepare_catalog)
+    future = loader.get(encoded_csv)   # starts the build the first time, returns at once
+    ...render the header...
+    catalog = future.result()          # only waits if the build is still running
+
+The catalog is a pure function of the encoded CSV, so one build is kept for
+the life of the process instead of expiring hourly; a different CSV (new
+secrets after a redeploy) replaces it. A failed build is retried by the next
+get(), and its exception is raised to whoever waits on it.
+
+When the build starts: Streamlit has no startup hook and runs none of the
+app's code until the first browser session connects, so the earliest point
+is the top of the first script run. pumpplaylist.py calls get() there,
+before drawing anything; the header still paints at once and only that
+first visitor can wait at Step 1. Every later session and rerun shares the
+finished build. To have it ready before anyone visits, request the page
+once after a deploy. playlist_api.py builds the catalog before it starts
+listening.
+
+This module deliberately doesn't import pandas: the build thread does, so on
+a cold process the import overlaps with the app rendering its header.
+"""
+
+import base64
+import logging
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+logger = logging.getLogger("pumpplaylist.catalog")
+
+# default_window is the filter_release_window() arguments for Step 1's
+# defaults (earliest release, nothing excluded); default_index is its
+# theme_index(); report is catalog_validation's report on df and similarity
+# is similarity_index(df)
+Catalog = namedtuple("Catalog", ["df", "default_window", "default_index", "report", "similarity"])
+
+
+def encoded_csv_from_file(path):
+    """The csv_data secret's form of a catalog file: a CSV, or text already holding the base64."""
+    path = Path(path)
+    if path.suffix.lower() == ".csv":
+        return base64.b64encode(path.read_bytes()).decode("ascii")
+    return path.read_text().strip()
+
+
+def prepare_catalog(encoded_csv):
+    """Everything a first visitor needs: the cleaned catalog, its report and indexes."""
+    from catalog_validation import summary_line, validate_catalog
+    from playlist_engine import build_catalog, filter_release_window, similarity_index, theme_index
+
+    df = build_catalog(encoded_csv)
+    report = validate_catalog(df)
+    if report["issue_count"]:
+        logger.warning("catalog check: %s", summary_line(report))
+    default_window = (str(df['Release'].iloc[0]), False, False)
+    return Catalog(df, default_window, theme_index(filter_release_window(df, *default_window)), report,
+                   similarity_index(df))
+
+
+class CatalogLoader:
+    """Shared by every session; get() is safe to call from any thread."""
+
+    def __init__(self, prepare=prepare_catalog):
+        self._prepare = prepare
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="catalog-loader")
+        self._lock = threading.Lock()
+        self._key = None
+        self._future = None
+
+    def get(self, encoded_csv):
+        """Future for the catalog built from encoded_csv, starting the build if needed."""
+        with self._lock:
+            future = self._future
+            failed = future is not None and future.done() and future.exception() is not None
+            if future is None or failed or self._key != encoded_csv:
+                self._key = encoded_csv
+                self._future = self._executor.submit(self._prepare, encoded_csv)
+            return self._future
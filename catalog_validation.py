@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Load-time checks on the catalog, reported instead of silently patched over.
+
+build_catalog() copes quietly with bad rows: an unknown release gets SortKey
+0 and sorts first, a malformed duration counts as 0 seconds, and a tag
+outside the app's lists is kept but no theme ever matches it.
+validate_catalog() finds those rows with one vectorized pass per check (no
+per-row Python) and returns a report:
+
+    {"rows": 1349, "issue_count": 3, "checks": {
+        "release_format": {"count": 4, "values": {"48 Celebration": 4}, "examples": [...]},
+        ...}}
+
+The report is built once per catalog build (catalog_loader.prepare_catalog)
+and shown in the app's ?perf=1 debug panel. To check a catalog by hand:
+
+    python catalog_validation.py public/playlist-data.txt   # the base64 csv_data secret
+    python catalog_validation.py data.csv --json
+"""
+
+import argparse
+import json
+import sys
+
+import pandas as pd
+
+from catalog_loader import encoded_csv_from_file
+from playlist_engine import (
+    MISSING_VALUES, TRACK_ID_COLUMNS, build_catalog, instructor_tags, tag_emojis, theme_tags, track_types,
+)
+
+KNOWN_TAGS = set(theme_tags) | set(instructor_tags) | set(tag_emojis)
+RELEASE_PATTERN = r"\d+(?:\.\d+)?|United"  # what build_catalog's sort key understands
+DURATION_PATTERN = r"\d{1,2}:[0-5]\d"  # MM:SS
+
+EXAMPLE_COLUMNS = ["Release", "Track No#", "Song Title", "Artist"]
+MAX_EXAMPLES = 5
+
+
+def _as_text(series):
+    return series.fillna("").astype(str).str.strip()
+
+
+def _check(df, bad, values):
+    """Report entry for the rows flagged in `bad`; `values` is what was wrong with each."""
+    count = int(bad.sum())
+    if not count:
+        return {"count": 0, "values": {}, "examples": []}
+    bad_values = values[bad]
+    first = bad_values.index[:MAX_EXAMPLES]
+    examples = df.loc[first, EXAMPLE_COLUMNS].assign(Value=bad_values.loc[first])
+    return {
+        "count": count,
+        "values": {str(k): int(v) for k, v in bad_values.value_counts().head(20).items()},
+        "examples": examples.to_dict("records"),
+    }
+
+
+def validate_catalog(df):
+    """Check a build_catalog() frame; returns the report dict described above."""
+    release = _as_text(df["Release"])
+    track = _as_text(df["Track No#"])
+    duration = _as_text(df["Duration"])
+    duration = duration.mask(duration.isin(MISSING_VALUES), "(missing)")
+
+    # One row per (catalog row, tag); cleaned tags are ", "-joined
+    tags = _as_text(df["Tags"])
+    tags = tags[~tags.isin(MISSING_VALUES)].str.split(", ").explode()
+    unknown = tags[~tags.isin(KNOWN_TAGS)]
+    unknown_rows = pd.Series(df.index.isin(unknown.index), index=df.index)
+    # Examples show each row's first unknown tag; "values" below counts every tag
+    first_unknown = unknown[~unknown.index.duplicated()].reindex(df.index)
+
+    duplicate = df.duplicated(subset=TRACK_ID_COLUMNS, keep="first")
+    # Which track is repeated, e.g. "[31] Perfect Day by Lou Reed"
+    repeated = df[duplicate]
+    duplicate_tracks = ("[" + _as_text(repeated["Release"]) + "] " + _as_text(repeated["Song Title"])
+                        + " by " + _as_text(repeated["Artist"])).reindex(df.index)
+
+    checks = {
+        "release_format": _check(df, ~release.str.fullmatch(RELEASE_PATTERN), release),
+        "track_type": _check(df, ~track.isin(track_types), track),
+        "duration_format": _check(df, ~duration.str.fullmatch(DURATION_PATTERN), duration),
+        "unknown_tags": _check(df, unknown_rows, first_unknown),
+        "duplicate_rows": _check(df, duplicate, duplicate_tracks),
+    }
+    # unknown_tags counts rows, but its values count tags
+    checks["unknown_tags"]["values"] = {str(k): int(v) for k, v in unknown.value_counts().items()}
+    return {
+        "rows": len(df),
+        "issue_count": sum(1 for check in checks.values() if check["count"]),
+        "checks": checks,
+    }
+
+
+def summary_line(report):
+    """One line for logs, e.g. "2 checks failed on 1349 rows: release_format 4, unknown_tags 120"."""
+    failed = [f"{name} {check['count']}" for name, check in report["checks"].items() if check["count"]]
+    if not failed:
+        return f"catalog OK ({report['rows']} rows)"
+    return f"{len(failed)} checks failed on {report['rows']} rows: " + ", ".join(failed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("path", help="catalog CSV, or a text file holding the base64 csv_data secret")
+    parser.add_argument("--json", action="store_true", help="print the full report as JSON")
+    args = parser.parse_args()
+
+    report = validate_catalog(build_catalog(encoded_csv_from_file(args.path)))
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2, default=str))
+    else:
+        print(summary_line(report))
+        for name, check in report["checks"].items():
+            if check["count"]:
+                values = ", ".join(f"{value!r} x{count}" for value, count in check["values"].items())
+                print(f"  {name}: {values}")
+    return 1 if report["issue_count"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,16 @@
 #!/usr/bin/env python3
 """
 Fill in Genre column for tracks in releases 1-59 that currently have no genre.
+
+The classifier is also importable: playlist_engine.build_catalog calls
+fill_missing_genres() on every catalog build so rows the offline pass never
+covered still get a genre.
 """
 
 import csv
 import re
+from collections import Counter
+from functools import lru_cache
 from pathlib import Path
 
 CSV_PATH = Path("/Users/jmisener/Downloads/pump-playlist-builder/public/data.csv")
@@ -105,130 +111,229 @@ R1_R2_RULES = {
 }
 
 
+# ─── Rule paths (reported in the run summary) ─────────────────────────────────
+
+RULE_PATHS = (
+    [f"r1r2:{keyword}" for keyword in R1_R2_RULES]
+    + [
+        "r1r2:default",
+        "artist:pop-tiebreaker",
+        "artist:jennifer-lopez-latin",
+        "artist:jennifer-lopez",
+        "artist:gloria-estefan-latin",
+        "artist:gloria-estefan",
+        "artist:shakira",
+        "artist:latin",
+        "artist:rock",
+        "artist:edm",
+        "artist:hip-hop",
+        "title:pump-it-bep",
+        "title:pump-it",
+        "title:rock-star-nerd",
+        "title:work-it-nelly",
+        "title:mj-pop",
+        "title:mj-jam",
+    ]
+    + [f"title:{keyword}" for keyword, genre in TITLE_RULES.items() if genre is not None]
+    + [
+        "title:whenever-wherever",
+        "default:pop",
+    ]
+)
+
+# Bounded so a pathological input file can't grow the cache without limit;
+# the real catalog has well under this many distinct (artist, title) pairs.
+CLASSIFY_CACHE_SIZE = 4096
+
+
 def normalize(s: str) -> str:
     return s.strip().lower()
 
 
-def artist_genre(artist: str, title: str = ""):
-    """Return genre based on artist name, or None if no match."""
-    a = normalize(artist)
+def _compile(names):
+    """Compile a list of substrings into one alternation regex."""
+    return re.compile("|".join(re.escape(name) for name in names))
 
-    # Pop tiebreakers take absolute priority
-    for pop in POP_TIEBREAKERS:
-        if pop in a:
-            return "Pop"
 
-    # Check artist-specific title overrides before general artist match
-    t = normalize(title)
+# Checked in order; the first match wins, so Pop tiebreakers take absolute
+# priority and LATIN is checked before EDM/HipHop for remaining artists.
+ARTIST_MATCHERS = [
+    ("pop-tiebreaker", _compile(POP_TIEBREAKERS)),
+    # Artists whose genre depends on the title
+    ("jennifer-lopez", _compile(["jennifer lopez", "j-lo", "j lo"])),
+    ("gloria-estefan", _compile(["gloria estefan"])),
+    # Shakira: "Whenever Wherever" → Latin, others → Latin (she's a Latin artist)
+    ("shakira", _compile(["shakira"])),
+    ("latin", _compile(LATIN_ARTISTS)),
+    ("rock", _compile(ROCK_ARTISTS)),
+    ("edm", _compile(EDM_ARTISTS)),
+    ("hip-hop", _compile(HIP_HOP_ARTISTS)),
+]
 
-    # Jennifer Lopez special cases
-    if "jennifer lopez" in a or "j-lo" in a or "j lo" in a:
-        if "let's get loud" in t or "lets get loud" in t:
-            return "Latin"
-        return "Pop"
 
-    # Gloria Estefan special cases
-    if "gloria estefan" in a:
-        if "oye" in t or "oya" in t:
-            return "Latin"
-        return "Pop"
+@lru_cache(maxsize=CLASSIFY_CACHE_SIZE)
+def _artist_class(a: str):
+    """Return which artist rule a normalized artist falls under, or None.
 
-    # Shakira: "Whenever Wherever" → Latin, others → Latin (she's a Latin artist)
-    if "shakira" in a:
-        return "Latin"
+    This is the expensive part (a scan over every artist list) and depends
+    only on the artist, so it is memoized separately from the full
+    (artist, title, release bucket) key.
+    """
+    for artist_class, pattern in ARTIST_MATCHERS:
+        if pattern.search(a):
+            return artist_class
+    return None
 
-    # Check LATIN first (before EDM/HipHop) for remaining artists
-    for lat in LATIN_ARTISTS:
-        if lat in a:
-            return "Latin"
 
-    # Check Rock
-    for rock in ROCK_ARTISTS:
-        if rock in a:
-            return "Rock"
+ARTIST_CLASS_GENRES = {
+    "pop-tiebreaker": "Pop",
+    "shakira": "Latin",
+    "latin": "Latin",
+    "rock": "Rock",
+    "edm": "EDM",
+    "hip-hop": "Hip-Hop",
+}
 
-    # Check EDM
-    for edm in EDM_ARTISTS:
-        if edm in a:
-            return "EDM"
 
-    # Check Hip-Hop
-    for hh in HIP_HOP_ARTISTS:
-        if hh in a:
-            return "Hip-Hop"
+def _artist_rule(a: str, t: str):
+    """Return (genre, rule path) for a normalized artist/title, or (None, None)."""
+    artist_class = _artist_class(a)
+    if artist_class is None:
+        return None, None
 
-    return None
+    # Jennifer Lopez special cases
+    if artist_class == "jennifer-lopez":
+        if "let's get loud" in t or "lets get loud" in t:
+            return "Latin", "artist:jennifer-lopez-latin"
+        return "Pop", "artist:jennifer-lopez"
 
+    # Gloria Estefan special cases
+    if artist_class == "gloria-estefan":
+        if "oye" in t or "oya" in t:
+            return "Latin", "artist:gloria-estefan-latin"
+        return "Pop", "artist:gloria-estefan"
+
+    return ARTIST_CLASS_GENRES[artist_class], f"artist:{artist_class}"
 
-def title_genre(title: str, artist: str = "", release: int = 0):
-    """Return genre based on title rules."""
-    t = normalize(title)
-    a = normalize(artist)
 
+def _title_rule(t: str, a: str, early: bool):
+    """Return (genre, rule path) for a normalized title/artist, or (None, None)."""
     # R1/R2 specific rules
-    if release in (1, 2):
+    if early:
         for keyword, genre in R1_R2_RULES.items():
             if keyword in t:
-                return genre
-        return "Pop"  # R1/R2 default
+                return genre, f"r1r2:{keyword}"
+        return "Pop", "r1r2:default"  # R1/R2 default
 
     # "Pump It" disambiguation
     if "pump it" in t:
         if "black eyed peas" in a:
-            return "Hip-Hop"
-        return "EDM"  # default for Pump It
+            return "Hip-Hop", "title:pump-it-bep"
+        return "EDM", "title:pump-it"  # default for Pump It
 
     # "Rock Star" disambiguation
     if "rock star" in t:
         if "n.e.r.d" in a or "nerd" in a:
-            return "Hip-Hop"
+            return "Hip-Hop", "title:rock-star-nerd"
 
     # "Work It" – Nelly version
     if "work it" in t and "nelly" in a:
-        return "Hip-Hop"
+        return "Hip-Hop", "title:work-it-nelly"
 
     # Michael Jackson titles that are Pop regardless of genre
     mj_titles = [
         "blood on the dance floor", "scream", "the way you make me feel"
     ]
     if any(mj in t for mj in mj_titles) and "michael jackson" in a:
-        return "Pop"
+        return "Pop", "title:mj-pop"
 
     # Jam by Michael Jackson
     if t.strip() == "jam" and "michael jackson" in a:
-        return "Pop"
+        return "Pop", "title:mj-jam"
 
     # Specific title rules
     for keyword, genre in TITLE_RULES.items():
         if genre is not None and keyword in t:
-            return genre
+            return genre, f"title:{keyword}"
 
     # Whenever Wherever
     if "whenever" in t and ("wherever" in t or "where" in t):
-        return "Latin"
+        return "Latin", "title:whenever-wherever"
 
-    return None
+    return None, None
 
 
-def determine_genre(release: int, title: str, artist: str) -> str:
-    """Determine the genre for a track."""
+def artist_genre(artist: str, title: str = ""):
+    """Return genre based on artist name, or None if no match."""
+    return _artist_rule(normalize(artist), normalize(title))[0]
+
+
+def title_genre(title: str, artist: str = "", release: int = 0):
+    """Return genre based on title rules."""
+    return _title_rule(normalize(title), normalize(artist), release in (1, 2))[0]
+
+
+@lru_cache(maxsize=CLASSIFY_CACHE_SIZE)
+def _classify(artist: str, title: str, early: bool):
+    """Classify an already-normalized (artist, title, release bucket) key."""
     # R1/R2: no reliable artist data, use title rules
-    if release in (1, 2):
-        return title_genre(title, artist, release) or "Pop"
+    if early:
+        return _title_rule(title, artist, early)
 
     # Step 1: Artist-based lookup (with title for disambiguation)
-    if artist.strip():
-        ag = artist_genre(artist, title)
-        if ag:
-            return ag
+    if artist:
+        genre, rule = _artist_rule(artist, title)
+        if genre:
+            return genre, rule
 
     # Step 2: Title-based keyword rules
-    tg = title_genre(title, artist, release)
-    if tg:
-        return tg
+    genre, rule = _title_rule(title, artist, early)
+    if genre:
+        return genre, rule
 
     # Step 3: Default
-    return "Pop"
+    return "Pop", "default:pop"
+
+
+def classify(release: int, title: str, artist: str):
+    """Return (genre, rule path) for a track, memoized on the normalized key."""
+    return _classify(normalize(artist), normalize(title), release in (1, 2))
+
+
+def determine_genre(release: int, title: str, artist: str) -> str:
+    """Determine the genre for a track."""
+    return classify(release, title, artist)[0]
+
+
+def fill_missing_genres(df):
+    """Return a copy of a catalog DataFrame with missing Genre values filled.
+
+    Only rows with a title and no genre are touched. Rows are normalized with
+    vectorized string ops and each distinct key is classified once.
+    """
+    # playlist_engine imports this module, so import it here rather than at the top
+    from playlist_engine import MISSING_VALUES
+
+    if "Genre" not in df.columns:
+        return df
+
+    genre = df["Genre"]
+    title = df["Song Title"].fillna("").astype(str)
+    missing = (genre.isna() | genre.astype(str).str.strip().isin(MISSING_VALUES)) \
+        & (title.str.strip() != "")
+    if not missing.any():
+        return df
+
+    artists = df.loc[missing, "Artist"].fillna("").astype(str).str.strip().str.lower()
+    titles = title[missing].str.strip().str.lower()
+    early = df.loc[missing, "Release"].astype(str).str.strip().isin(["1", "2"])
+
+    keys = list(zip(artists, titles, early))
+    genres = {key: _classify(*key)[0] for key in set(keys)}
+
+    df = df.copy()
+    df.loc[missing, "Genre"] = [genres[key] for key in keys]
+    return df
 
 
 def main():
@@ -249,6 +354,9 @@ def main():
 
     updated = 0
     assignments = []
+    rule_counts = Counter()
+    _classify.cache_clear()
+    _artist_class.cache_clear()
 
     for row in data:
         # Pad row if needed
@@ -273,7 +381,8 @@ def main():
         if current_genre or not title:
             continue
 
-        genre = determine_genre(release_num, title, artist)
+        genre, rule = classify(release_num, title, artist)
+        rule_counts[rule] += 1
         row[genre_idx] = genre
         updated += 1
         assignments.append((release_num, title, artist, genre))
@@ -290,12 +399,29 @@ def main():
     print(f"{'='*60}")
 
     # Genre distribution
-    from collections import Counter
     dist = Counter(g for _, _, _, g in assignments)
     print("\nGenre distribution:")
     for genre, count in sorted(dist.items(), key=lambda x: -x[1]):
         print(f"  {genre:12s}: {count}")
 
+    # Classification caches
+    print("\nClassification cache:")
+    for label, cached in [("track key", _classify), ("artist scan", _artist_class)]:
+        info = cached.cache_info()
+        lookups = info.hits + info.misses
+        hit_rate = info.hits / lookups if lookups else 0.0
+        print(f"  {label:12s}: {info.hits}/{lookups} hits ({hit_rate:.1%}), "
+              f"{info.currsize}/{info.maxsize} entries")
+
+    # Rule paths: which rules are hot, which never fire
+    print("\nRule paths:")
+    for rule, count in sorted(rule_counts.items(), key=lambda x: -x[1]):
+        print(f"  {rule:32s}: {count}")
+    dead = [rule for rule in RULE_PATHS if not rule_counts[rule]]
+    print(f"\nDead rule paths ({len(dead)}):")
+    for rule in dead:
+        print(f"  {rule}")
+
     # Sample: show all assignments grouped by genre
     print(f"\nSample assignments (first 15 per genre):")
     by_genre: dict[str, list] = {}
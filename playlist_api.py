@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""
+Local JSON HTTP API over the playlist engine, for scripts and the studio's
+booking system.
+
+    python playlist_api.py --data public/playlist-data.txt --port 8765
+    curl 'localhost:8765/playlist/random?early_release=80&seed=7'
+
+Endpoints (playlists come back in the app's JSON export shape, a list of
+{"name", "total_duration", "tracks"}):
+
+    GET  /catalog                  releases, slots, tags, genres, catalog check
+    GET  /search?q=pink&limit=20   tracks whose title or artist matches
+    GET  /playlist/random          ?count=N for a batch spread across classes
+    GET  /playlist/theme           ?tags=Halloween,Summer&instructor=Hard&genres=Pop
+    GET  /playlist/duration        ?target=55:00 (or seconds) &tolerance=30
+    POST /playlist/swap            {"tracks": [TrackID or null, x10], "slot": 3,
+                                    "mode": "random" | "similar"}
+
+The playlist endpoints also take the Step 1 window (early_release,
+use_recent, avoid_current), the mix preferences (recency, genres,
+difficulty, max_per_release, unique_artist) and seed.
+
+Every request reads one catalog, built once by catalog_loader exactly as the
+app builds it. Nothing writes to it, so requests share it and the cached
+release windows without copying. The event loop only parses HTTP; the
+pandas work runs on a thread pool, so slow requests don't hold up new
+connections.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from catalog_loader import CatalogLoader, encoded_csv_from_file
+from catalog_validation import summary_line
+from playlist_engine import (
+    apply_search_filter, assemble_playlist, build_duration_playlist, build_playlist_batch,
+    current_release_of, filter_release_window, instructor_tags, similar_tracks, tag_emojis,
+    theme_index, theme_mask, theme_tags, track_types,
+)
+from playlist_export import export_json, track_records
+
+logger = logging.getLogger("pumpplaylist.api")
+
+DATA_ENV_VAR = "PUMP_CSV_DATA"  # the csv_data secret, when --data isn't given
+DEFAULT_PORT = 8765
+
+MAX_BODY_BYTES = 64 * 1024
+MAX_BATCH = 20  # playlists per /playlist/random or /playlist/theme request
+MAX_SEARCH_RESULTS = 200
+WINDOW_CACHE_SIZE = 64  # release windows (and their theme indexes) kept
+REQUEST_TIMEOUT = 30  # seconds to receive a whole request, keep-alive idle time included
+
+DIFFICULTIES = ["Easy to Learn", "Hard"]
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=HTTPStatus.BAD_REQUEST):
+        super().__init__(message)
+        self.status = status
+
+
+# -------- Query parameters --------
+def _text(params, name, default=None):
+    values = params.get(name)
+    return values[-1] if values else default
+
+
+def _list(params, name):
+    """Comma-separated and/or repeated values: ?tags=A,B&tags=C."""
+    return [item.strip() for value in params.get(name, []) for item in value.split(",") if item.strip()]
+
+
+def _flag(params, name):
+    return str(_text(params, name, "")).lower() in ("1", "true", "yes")
+
+
+def _number(params, name, default, kind=int, low=None, high=None):
+    value = _text(params, name)
+    if value is None:
+        return default
+    try:
+        value = kind(value)
+    except ValueError:
+        raise ApiError(f"{name} must be a number")
+    if not math.isfinite(value):
+        raise ApiError(f"{name} must be a finite number")
+    if (low is not None and value < low) or (high is not None and value > high):
+        if high is None:
+            raise ApiError(f"{name} must be at least {low}")
+        if low is None:
+            raise ApiError(f"{name} must be at most {high}")
+        raise ApiError(f"{name} must be between {low} and {high}")
+    return value
+
+
+def _is_int(value):
+    # JSON true/false arrive as bool, which is an int subclass
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _seconds(value, name):
+    """"55:00" or "3300" as seconds."""
+    try:
+        if ":" in value:
+            minutes, seconds = (int(part) for part in value.split(":"))
+            if minutes < 0 or not 0 <= seconds < 60:
+                raise ValueError
+            total = minutes * 60 + seconds
+        else:
+            total = int(value)
+    except ValueError:
+        raise ApiError(f"{name} must be M:SS or seconds")
+    if total <= 0:
+        raise ApiError(f"{name} must be more than 0 seconds")
+    return total
+
+
+def _rng(params):
+    return np.random.default_rng(_number(params, "seed", None, low=0))
+
+
+def _preferences(params):
+    """The app's "Fine-tune the mix" options."""
+    difficulty = _text(params, "difficulty")
+    if difficulty is not None and difficulty not in DIFFICULTIES:
+        raise ApiError(f"difficulty must be one of {DIFFICULTIES}")
+    genres = _list(params, "genres")
+    return {
+        "recency": _number(params, "recency", 0.0, float, -3.0, 3.0),
+        "genre_mix": {genre: 1.0 for genre in genres} or None,
+        "difficulty": difficulty,
+        "max_per_release": _number(params, "max_per_release", 0, low=0, high=10) or None,
+        "unique_artist": _flag(params, "unique_artist"),
+    }
+
+
+def _json(payload):
+    return json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+
+# -------- Handlers --------
+class PlaylistService:
+    """Request handlers over one shared catalog.
+
+    Handlers only read the catalog, so any number of them can run at once on
+    the server's worker threads. handle() is the whole API without sockets.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.df = catalog.df
+        self.releases = self.df['Release'].astype(str).unique().tolist()
+        self.current_release = current_release_of(self.df)
+        catalog.similarity["vectors"].setflags(write=False)
+        self.window = lru_cache(maxsize=WINDOW_CACHE_SIZE)(self._window)
+        self.window_index = lru_cache(maxsize=WINDOW_CACHE_SIZE)(self._window_index)
+        self.known_tags = set(theme_tags) | set(instructor_tags) | set(tag_emojis)
+        self.info = _json({
+            "rows": len(self.df),
+            "releases": self.releases,
+            "current_release": self.current_release,
+            "track_types": track_types,
+            "theme_tags": theme_tags,
+            "instructor_tags": instructor_tags,
+            "genres": sorted(self.df['Genre'].dropna().astype(str).unique().tolist()),
+            "catalog_check": summary_line(catalog.report),
+        })
+        self.routes = {
+            ("GET", "/catalog"): lambda params, body: self.info,
+            ("GET", "/search"): self.search,
+            ("GET", "/playlist/random"): self.random_playlist,
+            ("GET", "/playlist/theme"): self.theme_playlist,
+            ("GET", "/playlist/duration"): self.duration_playlist,
+            ("POST", "/playlist/swap"): self.swap,
+        }
+
+    def handle(self, method, target, body=b""):
+        """(status, JSON bytes) for one request."""
+        url = urlsplit(target)
+        handler = self.routes.get((method, url.path))
+        if handler is None:
+            if any(path == url.path for _, path in self.routes):
+                return HTTPStatus.METHOD_NOT_ALLOWED, _json({"error": f"{method} not allowed"})
+            return HTTPStatus.NOT_FOUND, _json({"error": f"no endpoint {url.path}"})
+        try:
+            return HTTPStatus.OK, handler(parse_qs(url.query), body)
+        except ApiError as e:
+            return e.status, _json({"error": str(e)})
+        except Exception:
+            logger.exception("%s %s failed", method, target)
+            return HTTPStatus.INTERNAL_SERVER_ERROR, _json({"error": "internal error"})
+
+    # -------- Shared, cached per release window --------
+    def _window(self, early_release, use_recent, avoid_current):
+        return filter_release_window(self.df, early_release, use_recent, avoid_current, self.current_release)
+
+    def _window_index(self, key):
+        if key == self.catalog.default_window:
+            return self.catalog.default_index
+        return theme_index(self.window(*key))
+
+    def window_key(self, params):
+        early_release = _text(params, "early_release", self.releases[0])
+        if early_release not in self.releases:
+            raise ApiError(f"unknown early_release {early_release!r}")
+        return early_release, _flag(params, "use_recent"), _flag(params, "avoid_current")
+
+    # -------- Endpoints --------
+    def search(self, params, body):
+        query = _text(params, "q", "").strip()
+        if not query:
+            raise ApiError("q is required")
+        limit = _number(params, "limit", 50, low=1, high=MAX_SEARCH_RESULTS)
+        window = self.window(*self.window_key(params))
+        return _json({"query": query, "tracks": track_records(apply_search_filter(window, query).head(limit))})
+
+    def _batch(self, pool, params, theme):
+        count = _number(params, "count", 1, low=1, high=MAX_BATCH)
+        playlists = build_playlist_batch(pool, count, _preferences(params), _rng(params), theme=theme)
+        name = "Theme" if theme else "Random"
+        if count == 1:
+            return export_json([(name, playlists[0])])
+        return export_json([(f"{name} {i}", playlist) for i, playlist in enumerate(playlists, start=1)])
+
+    def random_playlist(self, params, body):
+        return self._batch(self.window(*self.window_key(params)), params, theme=False)
+
+    def theme_playlist(self, params, body):
+        tags, instructor, genres = _list(params, "tags"), _list(params, "instructor"), _list(params, "genres")
+        if not (tags or instructor or genres):
+            raise ApiError("pick at least one of tags, instructor or genres")
+        unknown = [tag for tag in tags + instructor if tag not in self.known_tags]
+        if unknown:
+            raise ApiError(f"unknown tags {unknown}")
+        key = self.window_key(params)
+        themed = self.window(*key)[theme_mask(self.window_index(key), tags, instructor, genres)]
+        return self._batch(themed, params, theme=True)
+
+    def duration_playlist(self, params, body):
+        target = _text(params, "target")
+        if target is None:
+            raise ApiError("target is required, e.g. target=55:00")
+        target_sec = _seconds(target, "target")
+        tolerance = _number(params, "tolerance", 30, low=0, high=600)
+        playlist = build_duration_playlist(self.window(*self.window_key(params)), target_sec,
+                                           _preferences(params), _rng(params), tolerance)
+        return export_json([("Duration", playlist)])
+
+    def swap(self, params, body):
+        try:
+            request = json.loads(body or b"{}")
+            ids = request["tracks"]
+            slot = request["slot"]
+        except (ValueError, KeyError, TypeError):
+            raise ApiError('body must be JSON with "tracks" and "slot"')
+        mode = request.get("mode", "random")
+        if mode not in ("random", "similar"):
+            raise ApiError('mode must be "random" or "similar"')
+        if not isinstance(ids, list) or len(ids) != len(track_types):
+            raise ApiError(f"tracks must list {len(track_types)} TrackIDs (null for an empty slot)")
+        slot = track_types.index(slot) if isinstance(slot, str) and slot in track_types else slot
+        if not _is_int(slot) or not 0 <= slot < len(track_types):
+            raise ApiError("slot must be a position 0-9 or a Track No#")
+
+        # Catalog positions of the current tracks; index labels are positions
+        lookup = self.catalog.similarity["track_ids"]
+        picks = {}
+        for track, track_id in zip(track_types, ids):
+            if track_id is None:
+                continue
+            pos = lookup.get_indexer([track_id])[0] if _is_int(track_id) else -1
+            if pos < 0 or self.df['Track No#'].iat[pos] != track:
+                raise ApiError(f"{track_id!r} is not a {track} TrackID")
+            picks[track] = pos
+
+        track = track_types[slot]
+        window = self.window(*self.window_key(params))
+        pool = window[window['Track No#'] == track]
+        pool = pool[~pool['SongKey'].isin(self.df['SongKey'].take(list(picks.values())))]
+        if not pool.empty:
+            if mode == "similar" and track in picks:
+                pool = similar_tracks(self.catalog.similarity, pool, self.df['TrackID'].iat[picks[track]])
+            picks[track] = pool.index[_rng(params).integers(len(pool))]
+        return export_json([("Playlist", assemble_playlist(self.df, picks))])
+
+
+# -------- HTTP --------
+async def _read_request(reader):
+    """(method, target, version, headers, body), or None when the client is done.
+
+    One deadline covers the request line, headers and body, so a client
+    that trickles bytes can't hold a connection open indefinitely.
+    """
+    return await asyncio.wait_for(_parse_request(reader), REQUEST_TIMEOUT)
+
+
+async def _parse_request(reader):
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    try:
+        method, target, version = line.decode("latin-1").split()
+    except ValueError:
+        raise ApiError("bad request line")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        length = -1
+    if length < 0:
+        raise ApiError("bad Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise ApiError("request body too large", HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+    body = await reader.readexactly(length) if length else b""
+    return method, target, version, headers, body
+
+
+def _response(status, payload, keep_alive):
+    head = (f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode("latin-1") + payload
+
+
+async def start_api(service, host="127.0.0.1", port=DEFAULT_PORT, workers=None):
+    """Start serving `service`; returns the asyncio server (port=0 picks a free port)."""
+    executor = ThreadPoolExecutor(max_workers=workers or os.cpu_count(), thread_name_prefix="playlist-api")
+    loop = asyncio.get_running_loop()
+
+    async def connection(reader, writer):
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except ApiError as e:
+                    writer.write(_response(e.status, _json({"error": str(e)}), False))
+                    break
+                if request is None:
+                    break
+                method, target, version, headers, body = request
+                status, payload = await loop.run_in_executor(executor, service.handle, method, target, body)
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                writer.write(_response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(connection, host, port)
+    server.executor = executor
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local JSON HTTP API over the playlist engine.")
+    parser.add_argument("--data", help=f"catalog CSV or base64 csv_data text (default: ${DATA_ENV_VAR}, "
+                                       "else the engine's default CSV)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=None, help="engine threads (default: CPU count)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+
+    encoded = encoded_csv_from_file(args.data) if args.data else os.environ.get(DATA_ENV_VAR)
+    catalog = CatalogLoader().get(encoded).result()
+    logger.info("catalog: %s", summary_line(catalog.report))
+
+    async def serve():
+        server = await start_api(PlaylistService(catalog), args.host, args.port, args.workers)
+        logger.info("serving on http://%s:%d", args.host, args.port)
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,677 @@
+"""
+Catalog loading and playlist generation, independent of the Streamlit UI.
+
+pumpplaylist.py wraps these in st.cache_data / widgets; the benchmarks drive
+them directly.
+"""
+
+import base64
+import io
+import re
+import unicodedata
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from fill_genres import fill_missing_genres
+
+# Track/Tag data
+track_types = [
+    "1 - Warmup", "2 - Squats", "3 - Chest", "4 - Back", "5 - Triceps",
+    "6 - Biceps", "7 - Lunges", "8 - Shoulders", "9 - Core", "10 - Cooldown"
+]
+
+tag_emojis = {
+    "Halloween": "🎃", "Women of Pop": "👩‍🎤", "Break-Up Songs": "💔",
+    "Beast Mode": "💪", "Positive Vibes": "✨", "Sing-Along": "🎤",
+    "Emo": "🎸", "P!nk": "💗", "New Year's Eve": "🥳", "Valentine's Day": "💘",
+    "Summer": "☀️", "Hard": "💀", "Easy to Learn": "😅",
+    "Short (<4:30)": "⏱️", "Long (>6 min)": "⌛"
+}
+
+theme_tags = ["Beast Mode", "Break-Up Songs", "Emo", "Halloween", "New Year's Eve", "P!nk",
+              "Positive Vibes", "Sing-Along", "Summer", "Valentine's Day", "Women of Pop"]
+instructor_tags = ["Easy to Learn", "Hard", "Short (<4:30)", "Long (>6 min)"]
+
+DEFAULT_CSV_PATH = "BPdata_89_Current.csv"
+
+
+# Columns that identify a catalog row, hashed into its TrackID
+TRACK_ID_COLUMNS = ["Track No#", "Song Title", "Artist", "Release"]
+# At most 15 digits: exact as a JavaScript number (< 2**53) and in a
+# spreadsheet cell (15 significant digits)
+TRACK_ID_BITS = 48
+HASH_MULTIPLIER = np.uint64(0x100000001B3)  # mixes per-column hashes into a row hash
+
+# How a missing value reads once a column is text: empty, a stringified
+# NaN/None, or the "-" placeholder rows use
+MISSING_VALUES = ["", "nan", "None", "-"]
+
+
+def placeholder_row(track, title="⚠️ No match found"):
+    """Row shown in a slot when nothing can fill it."""
+    return {
+        "Track No#": track, "Song Title": title, "Artist": "-",
+        "Release": "-", "Duration": "-", "Genre": "-", "Tags": "-"
+    }
+
+
+# -------- Catalog --------
+def read_catalog_csv(encoded_csv: Optional[str]):
+    # Release mixes numbers with names like "United"; without a fixed dtype a
+    # large file is parsed in chunks that disagree on the column type.
+    dtype = {"Release": str}
+    if encoded_csv:
+        decoded_bytes = base64.b64decode(encoded_csv)
+        # Pass the raw bytes to pandas
+        try:
+            return pd.read_csv(io.BytesIO(decoded_bytes), encoding="utf-8", dtype=dtype)
+        except UnicodeDecodeError:
+            return pd.read_csv(io.BytesIO(decoded_bytes), encoding="cp1252", dtype=dtype)
+    try:
+        return pd.read_csv(DEFAULT_CSV_PATH, encoding="utf-8", dtype=dtype)
+    except UnicodeDecodeError:
+        return pd.read_csv(DEFAULT_CSV_PATH, encoding="cp1252", dtype=dtype)
+
+
+def build_catalog(encoded_csv: Optional[str]):
+    """Decode, sort and clean the catalog (catalog_loader runs this off the script thread)."""
+    df = read_catalog_csv(encoded_csv)
+
+    # --- Sorting key for releases ---
+    def sort_key(x):
+        if str(x) == "United":
+            return 113.5
+        try:
+            return float(x)
+        except:
+            return 0
+
+    df["SortKey"] = map_distinct(df["Release"], sort_key)
+    df = df.sort_values("SortKey").reset_index(drop=True)
+
+    # --- Clean tags ---
+    def clean_tags(tag_str):
+        if pd.isna(tag_str) or str(tag_str).strip().lower() in ["nan", "none", "-"]:
+            return None
+        tags = [t.strip() for t in str(tag_str).split(",") if t.strip()]
+        replacements = {"Break-up Songs": "Break-Up Songs", "🌈": "✨"}
+        cleaned = [replacements.get(tag, tag) for tag in tags]
+        return ", ".join(sorted(set(cleaned))) if cleaned else None
+
+    df["Tags"] = map_distinct(df["Tags"], clean_tags)
+
+    # --- Fill genres the offline fill_genres.py pass didn't cover ---
+    df = fill_missing_genres(df)
+
+    # --- Normalize text fields to fix accent issues ---
+    for col in ["Song Title", "Artist", "Genre", "Tags"]:
+        if col in df.columns:
+            df[col] = map_distinct(df[col], lambda x: unicodedata.normalize("NFC", str(x)))
+
+    # --- Song identity, for "no song twice in a playlist" ---
+    df["SongKey"] = song_keys(df["Song Title"], df["Artist"])
+    # --- Catalog row identity: widget keys, session state, history, export ---
+    df["TrackID"] = track_ids(df)
+
+    return df
+
+
+def map_distinct(series, fn):
+    """series.apply(fn), calling fn once per distinct value.
+
+    Catalog columns repeat a lot (releases, tags, artists), so this is much
+    cheaper than a per-row apply on a large catalog.
+    """
+    codes, uniques = pd.factorize(series, use_na_sentinel=False)
+    values = pd.Series([fn(value) for value in uniques])
+    return pd.Series(values.to_numpy()[codes], index=series.index, dtype=values.dtype)
+
+
+def _row_hashes(ident):
+    # Hash each column's distinct values once and combine them per row
+    hashes = np.zeros(len(ident), dtype=np.uint64)
+    for column in ident.columns:
+        codes, uniques = pd.factorize(ident[column], use_na_sentinel=False)
+        column_hashes = pd.util.hash_array(np.asarray(uniques, dtype=object))
+        hashes = hashes * HASH_MULTIPLIER ^ column_hashes[codes]
+    return hashes
+
+
+def track_ids(df):
+    """Stable integer ID per row, from a content hash of TRACK_ID_COLUMNS.
+
+    The same row gets the same ID on every load (pandas hashes with a fixed
+    key). Identical rows, which the sheet sometimes has, are told apart by
+    their occurrence number so every ID is unique.
+
+    IDs are TRACK_ID_BITS wide so they survive a round trip through a
+    JavaScript number or a spreadsheet cell. Two rows landing on the same ID
+    is unlikely at that width; when it happens, the row with the larger full
+    hash moves to the next free ID, which doesn't depend on row order.
+    """
+    hashes = _row_hashes(df[TRACK_ID_COLUMNS].astype(str))
+    repeated = pd.Series(hashes).duplicated().to_numpy()
+    if repeated.any():
+        # Second and later copies of a row get their occurrence number mixed in
+        occurrence = pd.Series(hashes).groupby(hashes, sort=False).cumcount().to_numpy()
+        hashes[repeated] = (hashes[repeated] * HASH_MULTIPLIER
+                            ^ pd.util.hash_array(occurrence[repeated]))
+    ids = (hashes >> np.uint64(64 - TRACK_ID_BITS)).astype(np.int64)
+
+    collided = pd.Series(ids).duplicated(keep=False).to_numpy()
+    if collided.any():
+        taken = set(ids[~collided].tolist())
+        positions = np.flatnonzero(collided)
+        for pos in positions[np.argsort(hashes[positions], kind="stable")]:
+            track_id = int(ids[pos])
+            while track_id in taken:
+                track_id = (track_id + 1) % (1 << TRACK_ID_BITS)
+            taken.add(track_id)
+            ids[pos] = track_id
+    return pd.Series(ids, index=df.index)
+
+
+NON_ALPHANUMERIC = re.compile(r"[^0-9a-z]+")
+
+
+def _normalize_key(text):
+    # Fold case, accents and punctuation: "Don’t Stop" == "dont stop"
+    text = str(text)
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    return NON_ALPHANUMERIC.sub(" ", text.casefold()).strip()
+
+
+def song_keys(titles, artists):
+    """Normalized "title|artist" per row; the same song on two releases gets one key."""
+    artists = map_distinct(artists.astype(str), _normalize_key)
+    artists = artists.where(~artists.isin(["nan", "none"]), "")
+    return map_distinct(titles.astype(str), _normalize_key) + "|" + artists
+
+
+def current_release_of(df):
+    return str(df.loc[df['SortKey'].idxmax(), 'Release'])
+
+
+# -------- Helpers --------
+def duration_to_sec(dur):
+    try:
+        m, s = map(int, str(dur).split(":"))
+        return m * 60 + s
+    except:
+        return 0
+
+
+def duration_seconds(durations):
+    """duration_to_sec for a whole column: "M:SS" to seconds, NaN where malformed."""
+    parts = durations.astype(str).str.extract(r"^\s*(\d+):(\d{2})\s*$").astype(float)
+    return parts[0] * 60 + parts[1]
+
+
+def filter_release_window(df, early_release, use_recent=False, avoid_current_release=False,
+                          current_release=None):
+    """Rows from the earliest owned release onwards, per the Step 1 options."""
+    selected_sort = df[df['Release'].astype(str) == str(early_release)]['SortKey'].iloc[0]
+    filtered_df = df[df['SortKey'] >= selected_sort]
+    if use_recent:
+        top_10 = df['SortKey'].drop_duplicates().nlargest(10)
+        filtered_df = filtered_df[filtered_df['SortKey'].isin(top_10)]
+    if avoid_current_release:
+        if current_release is None:
+            current_release = current_release_of(df)
+        filtered_df = filtered_df[filtered_df['Release'].astype(str) != str(current_release)]
+    return filtered_df
+
+
+def apply_search_filter(df, search_term):
+    """Apply search filter to dataframe with exact matching and artist name normalization"""
+    if not search_term or not search_term.strip():
+        return df
+
+    search_lower = search_term.lower().strip()
+
+    def normalize_for_search(text):
+        """Normalize text for better search matching"""
+        text = text.lower()
+        # Handle common artist name variations
+        text = text.replace('p!nk', 'pink')
+        text = text.replace('pink', 'p!nk pink')  # Allow both to match
+        # Add more normalizations as needed
+        return text
+
+    def matches_search(row):
+        title = str(row.get('Song Title', '')).lower()
+        artist = str(row.get('Artist', '')).lower()
+
+        # Normalize both search term and data for special character matching
+        normalized_search = normalize_for_search(search_lower)
+        normalized_title = normalize_for_search(title)
+        normalized_artist = normalize_for_search(artist)
+
+        # Split search term into individual words for more precise matching
+        search_words = [word.strip() for word in search_lower.split() if word.strip()]
+
+        # For multi-word searches (like "lady gaga"), require ALL words to be present
+        if len(search_words) > 1:
+            # Check if all words in the search term are present in title or artist
+            title_match = all(word in normalized_title for word in search_words)
+            artist_match = all(word in normalized_artist for word in search_words)
+            return title_match or artist_match
+        else:
+            # For single word searches, use the original substring matching
+            single_word = search_words[0] if search_words else search_lower
+            if (single_word in title or single_word in artist or
+                single_word in normalized_title or single_word in normalized_artist):
+                return True
+
+        return False
+
+    return df[df.apply(matches_search, axis=1)]
+
+
+# -------- Theme availability --------
+def theme_index(window_df):
+    """Slot, tag and genre codes for every row of a release window.
+
+    Built once per window; counts and row masks for any theme/difficulty/genre
+    combination then come from numpy ops on these arrays instead of parsing
+    the Tags strings again. Also holds the per-(tag, slot) and
+    per-(genre, slot) count matrices.
+    """
+    tags = theme_tags + instructor_tags
+    tag_matrix = (window_df['Tags'].str.get_dummies(sep=", ")
+                  .reindex(columns=tags, fill_value=0).to_numpy(dtype=bool))
+    slots = pd.Categorical(window_df['Track No#'], categories=track_types).codes
+    genres = pd.Categorical(window_df['Genre'])
+    slot_onehot = np.eye(len(track_types), dtype=int)[slots[slots >= 0]]
+
+    return {
+        "slots": slots,
+        "tags": tag_matrix,
+        "tag_names": tags,
+        "genres": genres.codes,
+        "genre_names": list(genres.categories),
+        "tag_counts": pd.DataFrame(tag_matrix[slots >= 0].T.astype(int) @ slot_onehot,
+                                   index=tags, columns=track_types),
+        "genre_counts": pd.crosstab(window_df['Genre'], window_df['Track No#'])
+                          .reindex(columns=track_types, fill_value=0),
+    }
+
+
+def _any_tag(index, selected):
+    columns = [index["tag_names"].index(tag) for tag in selected if tag in index["tag_names"]]
+    return index["tags"][:, columns].any(axis=1)
+
+
+def theme_mask(index, selected_theme_tags, selected_instructor_tags, selected_genres):
+    """Row mask over the window for the Theme tab's filters.
+
+    A row matches with at least one selected theme tag, at least one selected
+    difficulty tag and one of the selected genres; an empty selection doesn't
+    filter.
+    """
+    mask = np.ones(len(index["slots"]), dtype=bool)
+    if selected_theme_tags:
+        mask &= _any_tag(index, selected_theme_tags)
+    if selected_instructor_tags:
+        mask &= _any_tag(index, selected_instructor_tags)
+    if selected_genres:
+        codes = [index["genre_names"].index(g) for g in selected_genres if g in index["genre_names"]]
+        mask &= np.isin(index["genres"], codes)
+    return mask
+
+
+def partial_mask(index, selected_tags):
+    """Rows with at least one of the selected tags (the "Partial match" pool)."""
+    return _any_tag(index, selected_tags)
+
+
+def slot_counts(index, mask):
+    """Matching rows per slot, as a Series over track_types."""
+    slots = index["slots"][mask]
+    return pd.Series(np.bincount(slots[slots >= 0], minlength=len(track_types)), index=track_types)
+
+
+# -------- Similarity --------
+# Feature scales for similarity_index(). Each of these adds about 1 to the
+# squared distance between two tracks: a tag only one of them has, a
+# different genre, SIMILAR_ERA_RELEASES releases apart, SIMILAR_DURATION_SEC
+# seconds apart, or a different Hard / Easy to Learn flag.
+SIMILAR_ERA_RELEASES = 15
+SIMILAR_DURATION_SEC = 60
+SIMILAR_K = 5  # "swap for something similar" picks among this many nearest tracks
+
+
+def similarity_index(df):
+    """Feature vector per catalog row for "more like this" lookups.
+
+    Built once per catalog from the tags, genre, release era, duration and
+    difficulty flags. Row i of "vectors" is the row labelled i in df, which
+    build_catalog's reset_index guarantees, so any filtered view of the
+    catalog (a release window, one slot) indexes straight into it.
+    """
+    tags = df['Tags'].str.get_dummies(sep=", ")
+    flags = tags.reindex(columns=["Hard", "Easy to Learn"], fill_value=0).astype(bool)
+    for column, flag in (("Hard?", "Hard"), ("Easy to Learn?", "Easy to Learn")):
+        if column in df:
+            flags[flag] |= df[column].notna().to_numpy()
+    # Difficulty and length tags are covered by their own features
+    tags = tags.drop(columns=[tag for tag in tags.columns if tag in MISSING_VALUES or tag in instructor_tags])
+
+    genre = df['Genre'].astype(str).where(~df['Genre'].astype(str).isin(MISSING_VALUES))
+    # Two one-hot columns differ between genres, so each gets half the cost
+    genres = pd.get_dummies(genre).to_numpy(dtype=np.float32) * np.sqrt(0.5)
+
+    era = df['SortKey'].rank(method="dense").to_numpy() / SIMILAR_ERA_RELEASES
+    seconds = duration_seconds(df['Duration'])
+    seconds = seconds.fillna(seconds.median() if seconds.notna().any() else 0).to_numpy()
+
+    vectors = np.hstack([
+        tags.to_numpy(dtype=np.float32),
+        genres,
+        flags.to_numpy(dtype=np.float32),
+        np.column_stack([era, seconds / SIMILAR_DURATION_SEC]).astype(np.float32),
+    ])
+    return {"vectors": vectors, "track_ids": pd.Index(df['TrackID'])}
+
+
+def similar_tracks(index, pool_df, track_id, k=SIMILAR_K):
+    """Rows of pool_df most like the catalog row track_id, nearest first.
+
+    pool_df is any filtered view of the catalog, e.g. one slot of the release
+    window minus the playlist's songs; the distances are one numpy pass over
+    its rows. k=None orders the whole pool.
+    """
+    if pool_df.empty:
+        return pool_df
+    target = index["vectors"][index["track_ids"].get_loc(track_id)]
+    distances = ((index["vectors"][pool_df.index.to_numpy()] - target) ** 2).sum(axis=1)
+    if k is None or k >= len(distances):
+        nearest = np.argsort(distances, kind="stable")
+    else:
+        nearest = np.argpartition(distances, k)[:k]
+        nearest = nearest[np.argsort(distances[nearest], kind="stable")]
+    return pool_df.iloc[nearest]
+
+
+# -------- Generation --------
+# Soft preferences for the playlist generators. With the defaults every row
+# in a slot is equally likely, i.e. a plain uniform draw.
+DEFAULT_PREFERENCES = {
+    "recency": 0.0,           # > 0 favors newer releases, < 0 older ("forgotten") ones
+    "genre_mix": None,        # {genre: target share}; other genres are rarely picked
+    "difficulty": None,       # "Easy to Learn" or "Hard": tracks with that tag are favored
+    "max_per_release": None,  # at most this many tracks from one release
+    "unique_artist": False,   # no artist twice in one playlist
+}
+
+DIFFICULTY_BOOST = 4.0
+GENRE_FLOOR = 0.05  # weight of an off-target genre, relative to the least favored target genre
+MISSING_ARTISTS = {value.lower() for value in MISSING_VALUES}  # compared lowercased
+ALLOCATOR_BUDGET = 5000  # candidate checks per search before settling for a partial fill
+DURATION_TOLERANCE_SEC = 30  # build_duration_playlist stops once the total is this close
+DURATION_PASSES = 2  # rounds of per-slot swaps build_duration_playlist tries
+
+
+def track_weights(df, preferences=None):
+    """Sampling weight per row of df (a numpy array) for the soft preferences."""
+    prefs = {**DEFAULT_PREFERENCES, **(preferences or {})}
+    weights = np.ones(len(df))
+    if df.empty:
+        return weights
+
+    if prefs["recency"]:
+        # 0 for the oldest release in df, 1 for the newest
+        rank = df['SortKey'].rank(method="dense").to_numpy()
+        span = rank.max() - 1
+        position = (rank - 1) / span if span else np.zeros(len(df))
+        weights *= np.exp(prefs["recency"] * position)
+
+    if prefs["genre_mix"]:
+        # Scale each genre by target share / actual share so the expected mix
+        # of a draw matches the targets
+        shares = df['Genre'].value_counts(normalize=True)
+        targets = pd.Series(prefs["genre_mix"], dtype=float)
+        targets = targets / targets.sum()
+        ratio = targets.reindex(shares.index).fillna(0) / shares
+        on_target = ratio[ratio > 0]
+        floor = GENRE_FLOOR * on_target.min() if not on_target.empty else 1.0
+        weights *= df['Genre'].map(ratio.clip(lower=floor)).fillna(floor).to_numpy()
+
+    if prefs["difficulty"]:
+        tagged = df['Tags'].str.contains(prefs["difficulty"], regex=False, na=False).to_numpy()
+        weights *= np.where(tagged, DIFFICULTY_BOOST, 1.0)
+
+    return weights
+
+
+class _Allocator:
+    """Assign one row per slot so no song repeats, plus the optional rules.
+
+    Every row gets a random key log(u) / weight; a slot's best key is a
+    weighted draw, and its keys in descending order are a weighted shuffle.
+    The search fills the slots with the fewest rows first and backtracks when
+    a slot has nothing left, so a full playlist is found whenever one exists
+    (within ALLOCATOR_BUDGET candidate checks).
+    """
+
+    def __init__(self, df, pools, weights, prefs, rng):
+        self.pools = pools
+        self.slots = sorted(pools, key=lambda t: len(pools[t]))
+        with np.errstate(divide="ignore"):
+            self.keys = np.log(rng.random(len(df))) / weights
+        self.songs = df['SongKey'].to_numpy()
+        self.max_per_release = prefs["max_per_release"]
+        self.unique_artist = prefs["unique_artist"]
+        # Only the columns an enabled rule needs
+        if self.max_per_release:
+            self.releases = df['Release'].astype(str).to_numpy()
+        if self.unique_artist:
+            artists = df['Artist'].astype(str).str.strip().str.lower()
+            self.artists = artists.where(~artists.isin(MISSING_ARTISTS), "").to_numpy()
+
+        self.used_songs = set()
+        self.used_artists = set()
+        self.release_counts = {}
+        self.budget = 0
+
+    def candidates(self, track):
+        positions = self.pools[track]
+        keys = self.keys[positions]
+        best = keys.argmax()
+        yield positions[best]
+        # Only slots that hit a conflict pay for the full ordering
+        for i in np.argsort(-keys, kind="stable"):
+            if i != best:
+                yield positions[i]
+
+    def fits(self, pos, strict):
+        self.budget -= 1
+        if self.songs[pos] in self.used_songs:
+            return False
+        if strict:
+            if self.unique_artist and self.artists[pos] in self.used_artists:
+                return False
+            if self.max_per_release and self.release_counts.get(self.releases[pos], 0) >= self.max_per_release:
+                return False
+        return True
+
+    def take(self, pos):
+        self.used_songs.add(self.songs[pos])
+        if self.unique_artist and self.artists[pos]:
+            self.used_artists.add(self.artists[pos])
+        if self.max_per_release:
+            self.release_counts[self.releases[pos]] = self.release_counts.get(self.releases[pos], 0) + 1
+
+    def release(self, pos):
+        self.used_songs.discard(self.songs[pos])
+        if self.unique_artist:
+            self.used_artists.discard(self.artists[pos])
+        if self.max_per_release:
+            self.release_counts[self.releases[pos]] -= 1
+
+    def search(self, i, picks, strict):
+        if i == len(self.slots):
+            return True
+        track = self.slots[i]
+        for pos in self.candidates(track):
+            if self.budget <= 0:
+                return False
+            if not self.fits(pos, strict):
+                continue
+            self.take(pos)
+            picks[track] = pos
+            if self.search(i + 1, picks, strict):
+                return True
+            self.release(pos)
+            del picks[track]
+        return False
+
+    def greedy(self):
+        """Best-effort fill when no full assignment was found: honor the
+        optional rules where possible, never repeat a song, else leave empty."""
+        picks = {}
+        for track in self.slots:
+            for strict in (True, False):
+                pos = next((p for p in self.candidates(track) if self.fits(p, strict)), None)
+                if pos is not None:
+                    self.take(pos)
+                    picks[track] = pos
+                    break
+        return picks
+
+    def allocate(self):
+        # The optional rules are preferences: drop them before giving up on a
+        # full playlist
+        passes = [True, False] if self.max_per_release or self.unique_artist else [False]
+        for strict in passes:
+            picks = {}
+            self.budget = ALLOCATOR_BUDGET
+            if self.search(0, picks, strict):
+                return picks
+        self.budget = float("inf")
+        return self.greedy()
+
+
+def build_weighted_playlist(filtered_df, preferences=None, rng=None,
+                            empty_title="⚠️ No match found"):
+    """Draw one track per slot by preference weight, with no song twice.
+
+    Without conflicts this is one vectorized weighted choice per slot; only
+    slots that collide with an earlier pick go through the backtracking
+    search, so a draw costs about the same as a uniform sample(1) per slot.
+    """
+    prefs = {**DEFAULT_PREFERENCES, **(preferences or {})}
+    rng = rng if rng is not None else np.random.default_rng()
+    _, picks = _allocate(filtered_df, prefs, rng)
+    return assemble_playlist(filtered_df, picks, empty_title)
+
+
+def _allocate(filtered_df, prefs, rng):
+    """The allocator for filtered_df and its picks, {track: row position}."""
+    weights = track_weights(filtered_df, prefs)
+    pools = filtered_df.groupby('Track No#', sort=False).indices
+    pools = {track: pools[track] for track in track_types if track in pools}
+    allocator = _Allocator(filtered_df, pools, weights, prefs, rng)
+    return allocator, allocator.allocate()
+
+
+def assemble_playlist(filtered_df, picks, empty_title="⚠️ No match found"):
+    """Playlist in slot order from {track: row position}, placeholders for the rest."""
+    playlist = []
+    for track in track_types:
+        pick = picks.get(track)
+        if pick is not None:
+            playlist.append(filtered_df.iloc[[pick]])
+        else:
+            playlist.append(pd.DataFrame([placeholder_row(track, empty_title)]))
+    # Keep every catalog column even when every slot is a placeholder
+    columns = filtered_df.columns.union(list(placeholder_row(track_types[0])), sort=False)
+    playlist = pd.concat(playlist, ignore_index=True).reindex(columns=columns)
+    # Placeholder rows have no TrackID. Take the real ones from the catalog:
+    # after concat with a placeholder the column is float
+    track_ids = filtered_df['TrackID'].to_numpy()
+    playlist['TrackID'] = pd.array([track_ids[picks[track]] if track in picks else pd.NA
+                                    for track in track_types], dtype="Int64")
+    return playlist
+
+
+def build_random_playlist(filtered_df, preferences=None, rng=None):
+    return build_weighted_playlist(filtered_df, preferences, rng)
+
+
+def build_theme_playlist(filtered_df, preferences=None, rng=None):
+    # A slot with no themed track left shows "no themed track available";
+    # tracks from other positions aren't moved in as that breaks the workout
+    # structure.
+    return build_weighted_playlist(filtered_df, preferences, rng,
+                                   empty_title="⚠️ No themed track available")
+
+
+def build_duration_playlist(filtered_df, target_sec, preferences=None, rng=None,
+                            tolerance=DURATION_TOLERANCE_SEC):
+    """Weighted playlist whose total time is within `tolerance` of target_sec where the catalog allows.
+
+    Starts from the weighted draw, then visits the slots in random order and
+    swaps each for the same-slot track that brings the total closest to the
+    target (a random one of those already within tolerance, so results vary).
+    Swaps never repeat a song and keep max_per_release / unique_artist. Rows
+    without a readable duration are left out, so the total is exact.
+    """
+    prefs = {**DEFAULT_PREFERENCES, **(preferences or {})}
+    rng = rng if rng is not None else np.random.default_rng()
+    seconds = duration_seconds(filtered_df['Duration'])
+    timed = filtered_df[seconds.notna().to_numpy()]
+    seconds = seconds.dropna().to_numpy()
+    allocator, picks = _allocate(timed, prefs, rng)
+
+    total = seconds[list(picks.values())].sum()
+    for _ in range(DURATION_PASSES):
+        for track in rng.permutation(list(picks)):
+            if abs(total - target_sec) <= tolerance:
+                return assemble_playlist(timed, picks)
+            others = [pos for other, pos in picks.items() if other != track]
+            pool = allocator.pools[track]
+            allowed = ~np.isin(allocator.songs[pool], allocator.songs[others])
+            if allocator.unique_artist:
+                taken = [artist for artist in allocator.artists[others] if artist]
+                allowed &= ~np.isin(allocator.artists[pool], taken)
+            if allocator.max_per_release:
+                counts = pd.Series(allocator.releases[others]).value_counts()
+                used = pd.Series(allocator.releases[pool]).map(counts).fillna(0).to_numpy()
+                allowed &= used < allocator.max_per_release
+            candidates = pool[allowed]  # includes the current pick
+            if candidates.size == 0:
+                continue
+            miss = np.abs(total - seconds[picks[track]] + seconds[candidates] - target_sec)
+            close = candidates[miss <= tolerance]
+            pos = rng.choice(close) if close.size else candidates[miss.argmin()]
+            total += seconds[pos] - seconds[picks[track]]
+            picks[track] = pos
+    return assemble_playlist(timed, picks)
+
+
+def build_playlist_batch(filtered_df, count, preferences=None, rng=None, theme=False):
+    """`count` playlists for a run of classes, spreading tracks across them.
+
+    A track comes back in a later playlist only once every track for its slot
+    has been used, so a term's worth of classes repeats as little as the
+    catalog allows.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    build = build_theme_playlist if theme else build_random_playlist
+    used = set()
+    playlists = []
+    for _ in range(count):
+        pool = filtered_df[~filtered_df['TrackID'].isin(used)]
+        exhausted = set(filtered_df['Track No#']) - set(pool['Track No#'])
+        if exhausted:
+            # Start those slots over
+            used -= set(filtered_df.loc[filtered_df['Track No#'].isin(exhausted), 'TrackID'])
+            pool = filtered_df[~filtered_df['TrackID'].isin(used)]
+        playlist = build(pool, preferences, rng)
+        used.update(playlist['TrackID'].dropna())
+        playlists.append(playlist)
+    return playlists
@@ -0,0 +1,176 @@
+"""
+Playlist exports: copy/paste text, CSV, JSON and a printable HTML sheet.
+
+Every export takes a list of (name, playlist_df) pairs, so one playlist and a
+whole term's batch go through the same code. Outputs are cached on the
+playlist names and each row's TrackID, which is cheap to compute: the app
+only builds an export when it is asked for, and asking again for the same
+playlists reuses it.
+
+    playlists = [("Class 1", df1), ("Class 2", df2)]
+    export_csv(playlists)     # bytes
+    export_json(playlists)    # bytes
+    export_sheet(playlists)   # bytes, HTML with one page per playlist
+"""
+
+import html
+import io
+import json
+from functools import lru_cache
+
+import pandas as pd
+
+from playlist_engine import MISSING_VALUES, duration_to_sec
+
+EXPORT_COLUMNS = ["TrackID", "Release", "Track No#", "Song Title", "Artist", "Duration", "Genre", "Tags"]
+EXPORT_CACHE_SIZE = 64
+
+
+def playlist_identity(playlists):
+    """Hashable key for a list of (name, playlist_df): what the exports depend on.
+
+    A TrackID pins the row's exported columns, so the key is the names plus
+    each row's TrackID; placeholder rows have none and count by their title.
+    """
+    return tuple(
+        (name, tuple(title if pd.isna(track_id) else int(track_id)
+                     for track_id, title in zip(playlist_df['TrackID'].tolist(),
+                                                playlist_df['Song Title'].tolist())))
+        for name, playlist_df in playlists
+    )
+
+
+class _Playlists:
+    """The playlists, hashed and compared by playlist_identity() so lru_cache can key on them."""
+
+    def __init__(self, playlists):
+        self.playlists = playlists
+        self.identity = playlist_identity(playlists)
+
+    def __hash__(self):
+        return hash(self.identity)
+
+    def __eq__(self, other):
+        return self.identity == other.identity
+
+    def rows(self):
+        """(name, export_rows(playlist_df)) per playlist."""
+        return [(name, export_rows(playlist_df)) for name, playlist_df in self.playlists]
+
+
+def export_rows(df):
+    """The EXPORT_COLUMNS values of each row of df as a tuple, None for missing."""
+    rows = df.reindex(columns=EXPORT_COLUMNS)
+    rows = rows.astype(object).where(rows.notna(), None)
+    return list(rows.itertuples(index=False, name=None))
+
+
+def track_records(df):
+    """Rows of df as the JSON export writes its tracks."""
+    return [_record(row) for row in export_rows(df)]
+
+
+def format_duration(total_sec):
+    min_, sec = divmod(total_sec, 60)
+    return f"{min_}:{str(sec).zfill(2)}"
+
+
+def _total(rows):
+    return format_duration(sum(duration_to_sec(row[5]) for row in rows))
+
+
+def _clean(value):
+    # Placeholder and missing values export as empty
+    return "" if value is None or str(value) in MISSING_VALUES else value
+
+
+def _record(row):
+    return {column: _clean(value) or None for column, value in zip(EXPORT_COLUMNS, row)}
+
+
+# -------- Builders (cached on playlist_identity) --------
+@lru_cache(maxsize=EXPORT_CACHE_SIZE)
+def _text(playlists):
+    blocks = []
+    for name, rows in playlists.rows():
+        lines = [f"{name} - Total Time: {_total(rows)}"]
+        lines += [f"{row[1]} - {row[2]}: {row[3]} — {row[4]} ({row[5]})" for row in rows]
+        blocks.append("\n".join(lines) + "\n")
+    return "\n".join(blocks)
+
+
+@lru_cache(maxsize=EXPORT_CACHE_SIZE)
+def _csv(playlists):
+    records = [
+        (name, position, *(_clean(value) for value in row))
+        for name, rows in playlists.rows()
+        for position, row in enumerate(rows, start=1)
+    ]
+    out = io.StringIO()
+    pd.DataFrame(records, columns=["Playlist", "Position", *EXPORT_COLUMNS]).to_csv(out, index=False)
+    # BOM so spreadsheet apps open accented names correctly
+    return out.getvalue().encode("utf-8-sig")
+
+
+@lru_cache(maxsize=EXPORT_CACHE_SIZE)
+def _json(playlists):
+    playlists = [{
+        "name": name,
+        "total_duration": _total(rows),
+        "tracks": [_record(row) for row in rows],
+    } for name, rows in playlists.rows()]
+    return json.dumps(playlists, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+SHEET_STYLE = """
+body { font-family: sans-serif; color: #22223b; margin: 2rem; }
+section { page-break-after: always; margin-bottom: 2rem; }
+section:last-child { page-break-after: auto; }
+h2 { margin-bottom: 0.2rem; }
+.total { color: #555; margin-top: 0; }
+table { border-collapse: collapse; width: 100%; }
+th, td { border-bottom: 1px solid #ddd; padding: 0.35rem 0.5rem; text-align: left; }
+th { background: #f0f0f5; }
+"""
+
+
+@lru_cache(maxsize=EXPORT_CACHE_SIZE)
+def _sheet(playlists):
+    sections = []
+    for name, rows in playlists.rows():
+        body = "".join(
+            "<tr>" + "".join(f"<td>{html.escape(str(_clean(value)))}</td>" for value in row[1:6]) + "</tr>"
+            for row in rows
+        )
+        sections.append(
+            f"<section><h2>{html.escape(name)}</h2><p class='total'>Total time: {_total(rows)}</p>"
+            "<table><tr><th>Release</th><th>Track</th><th>Song</th><th>Artist</th><th>Duration</th></tr>"
+            f"{body}</table></section>"
+        )
+    return (f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>Pump Playlists</title>"
+            f"<style>{SHEET_STYLE}</style></head><body>{''.join(sections)}</body></html>").encode("utf-8")
+
+
+# -------- Public API --------
+def export_text(playlists):
+    return _text(_Playlists(playlists))
+
+
+def export_csv(playlists):
+    return _csv(_Playlists(playlists))
+
+
+def export_json(playlists):
+    return _json(_Playlists(playlists))
+
+
+def export_sheet(playlists):
+    return _sheet(_Playlists(playlists))
+
+
+# label, file extension, mime type, builder
+EXPORT_FORMATS = [
+    ("CSV", "csv", "text/csv", export_csv),
+    ("JSON", "json", "application/json", export_json),
+    ("Printable sheet", "html", "text/html", export_sheet),
+]
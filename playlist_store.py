@@ -0,0 +1,264 @@
+"""
+Saved playlists and teaching history in a local SQLite file.
+
+    store = PlaylistStore("playlists.db")
+    store.save_playlist(profile, playlist_df, method="random", taught=True)
+    store.recently_taught(profile, days=28)   # {track_id, ...}
+
+Tracks are stored by their catalog row identity (the TrackID column), so
+"tracks I taught recently" is an indexed lookup the generators can use to
+leave those rows out. Writes go through a queue to one background thread
+that commits them in batches, so saving from a Streamlit callback returns
+immediately.
+
+Reads never wait for that thread. Their results are cached per profile, and
+a profile's cache is dropped whenever one of its writes is queued or
+committed, so rendering the history on every rerun costs a dict lookup. A
+read taken while the profile still has queued writes isn't cached, so the
+next read after the commit sees them. Call flush() to wait for the queue.
+"""
+
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import Counter
+from contextlib import closing
+
+import pandas as pd
+
+logger = logging.getLogger("pumpplaylist.store")
+
+DB_ENV_VAR = "PUMP_DB_PATH"
+DEFAULT_DB_PATH = "playlists.db"
+
+BATCH_SIZE = 50  # queued writes committed per transaction
+FLUSH_TIMEOUT = 2.0  # seconds flush() and close() wait for queued writes
+READ_CACHE_SIZE = 512  # cached read results, across profiles
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS playlists (
+    id INTEGER PRIMARY KEY,
+    profile TEXT NOT NULL,
+    method TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    taught_at REAL,
+    favorite INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS playlist_tracks (
+    playlist_id INTEGER NOT NULL REFERENCES playlists(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    track_id INTEGER NOT NULL,
+    track_no TEXT,
+    song_title TEXT,
+    artist TEXT,
+    release TEXT,
+    duration TEXT,
+    PRIMARY KEY (playlist_id, position)
+);
+CREATE INDEX IF NOT EXISTS idx_playlists_taught ON playlists(profile, taught_at);
+CREATE INDEX IF NOT EXISTS idx_playlists_created ON playlists(profile, created_at);
+CREATE INDEX IF NOT EXISTS idx_playlists_favorite ON playlists(profile, favorite, created_at);
+CREATE INDEX IF NOT EXISTS idx_tracks_id ON playlist_tracks(track_id);
+"""
+
+TRACK_COLUMNS = ["Track No#", "Song Title", "Artist", "Release", "Duration"]
+
+
+def default_db_path():
+    return os.environ.get(DB_ENV_VAR, DEFAULT_DB_PATH)
+
+
+class PlaylistStore:
+    """Thread-safe store shared by every session of the app."""
+
+    def __init__(self, path=None):
+        self.path = path or default_db_path()
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")  # readers don't block the writer
+            conn.executescript(SCHEMA)
+
+        self._queue = queue.Queue()
+        self._pending = 0
+        self._done = threading.Condition()
+        # Guarded by _done: queued writes per profile, a counter bumped on
+        # every write so a read can tell it raced one, and the read cache
+        self._unsaved = Counter()
+        self._generation = Counter()
+        self._cache = {}
+        self._writer = threading.Thread(target=self._write_loop, name="playlist-store", daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    # -------- Writes (queued) --------
+    def _submit(self, profile, op, *args):
+        with self._done:
+            self._pending += 1
+            if profile is not None:
+                self._unsaved[profile] += 1
+                self._invalidate(profile)
+        self._queue.put((profile, op, args))
+
+    def _invalidate(self, profile):
+        self._generation[profile] += 1
+        for key in [key for key in self._cache if key[0] == profile]:
+            del self._cache[key]
+
+    def _write_loop(self):
+        conn = self._connect()
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(op is None for _, op, _ in batch)
+            writes = [(op, args) for _, op, args in batch if op is not None]
+            try:
+                with conn:  # one transaction per batch
+                    for op, args in writes:
+                        op(conn, *args)
+                failed = False
+            except Exception:
+                failed = True
+            if failed:
+                # Replay the batch one write per transaction so a bad write only loses itself
+                for op, args in writes:
+                    try:
+                        with conn:
+                            op(conn, *args)
+                    except Exception:
+                        logger.exception("playlist store: dropped %s write", op.__name__)
+            with self._done:
+                self._pending -= len(batch)
+                for profile, _, _ in batch:
+                    if profile is not None:
+                        self._unsaved[profile] -= 1
+                        self._invalidate(profile)
+                self._done.notify_all()
+            if stop:
+                conn.close()
+                return
+
+    def save_playlist(self, profile, playlist_df, method, taught=False, favorite=False):
+        """Queue a playlist for saving. Placeholder rows (no TrackID) are skipped."""
+        now = time.time()
+        tracks = [
+            (position, int(row["TrackID"]), *(str(row[col]) for col in TRACK_COLUMNS))
+            for position, (_, row) in enumerate(playlist_df.iterrows())
+            if pd.notna(row.get("TrackID"))
+        ]
+        self._submit(profile, _insert_playlist, profile, method, now, now if taught else None,
+                     int(favorite), tracks)
+
+    def set_favorite(self, profile, playlist_id, favorite=True):
+        self._submit(profile, _update_playlist, "favorite", int(favorite), profile, playlist_id)
+
+    def mark_taught(self, profile, playlist_id, when=None):
+        self._submit(profile, _update_playlist, "taught_at", when or time.time(), profile, playlist_id)
+
+    def delete_playlist(self, profile, playlist_id):
+        self._submit(profile, _delete_playlist, profile, playlist_id)
+
+    def flush(self, timeout=FLUSH_TIMEOUT):
+        """Wait until queued writes are committed; False if that took too long."""
+        with self._done:
+            return self._done.wait_for(lambda: self._pending == 0, timeout)
+
+    def close(self):
+        self._submit(None, None)
+        self._writer.join(FLUSH_TIMEOUT)
+
+    # -------- Reads (cached) --------
+    def _read(self, query, profile, *args):
+        """query(conn, profile, *args), from the cache when this profile hasn't written since."""
+        key = (profile, query.__name__, args)
+        with self._done:
+            if key in self._cache:
+                return self._cache[key]
+            generation = self._generation[profile]
+            settled = not self._unsaved[profile]
+        with closing(self._connect()) as conn:
+            result = query(conn, profile, *args)
+        with self._done:
+            # Not if a write was queued meanwhile or was already waiting
+            if settled and self._generation[profile] == generation:
+                if len(self._cache) >= READ_CACHE_SIZE:
+                    del self._cache[next(iter(self._cache))]
+                self._cache[key] = result
+        return result
+
+    def recently_taught(self, profile, days):
+        """TrackIDs of tracks in playlists taught within the last `days` days."""
+        # Keyed by day so the window moves forward in a long-running process
+        return self._read(_recently_taught, profile, days, int(time.time() // 86400))
+
+    def playlists(self, profile, favorites_only=False, limit=20):
+        """Newest saved playlists, each a dict with its tracks in slot order.
+
+        The result is shared with other callers through the cache; don't modify it.
+        """
+        return self._read(_playlists, profile, favorites_only, limit)
+
+
+def _recently_taught(conn, profile, days, today):
+    since = (today - days) * 86400  # from midnight (UTC) `days` days ago
+    rows = conn.execute(
+        """SELECT DISTINCT t.track_id FROM playlists p
+           JOIN playlist_tracks t ON t.playlist_id = p.id
+           WHERE p.profile = ? AND p.taught_at >= ?""",
+        (profile, since),
+    )
+    return frozenset(row["track_id"] for row in rows)
+
+
+def _playlists(conn, profile, favorites_only, limit):
+    where = "profile = ? AND favorite = 1" if favorites_only else "profile = ?"
+    playlists = [dict(row) for row in conn.execute(
+        f"SELECT * FROM playlists WHERE {where} ORDER BY created_at DESC LIMIT ?",
+        (profile, limit),
+    )]
+    if not playlists:
+        return playlists
+    by_id = {playlist["id"]: playlist for playlist in playlists}
+    for playlist in playlists:
+        playlist["tracks"] = []
+    # Every playlist's tracks in one query
+    placeholders = ", ".join("?" * len(by_id))
+    for row in conn.execute(
+        f"SELECT * FROM playlist_tracks WHERE playlist_id IN ({placeholders}) ORDER BY playlist_id, position",
+        list(by_id),
+    ):
+        by_id[row["playlist_id"]]["tracks"].append(dict(row))
+    return playlists
+
+
+def _insert_playlist(conn, profile, method, created_at, taught_at, favorite, tracks):
+    cursor = conn.execute(
+        "INSERT INTO playlists (profile, method, created_at, taught_at, favorite) VALUES (?, ?, ?, ?, ?)",
+        (profile, method, created_at, taught_at, favorite),
+    )
+    conn.executemany(
+        """INSERT INTO playlist_tracks
+           (playlist_id, position, track_id, track_no, song_title, artist, release, duration)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+        [(cursor.lastrowid, *track) for track in tracks],
+    )
+
+
+def _update_playlist(conn, column, value, profile, playlist_id):
+    # column is one of our own names, never user input
+    conn.execute(f"UPDATE playlists SET {column} = ? WHERE id = ? AND profile = ?",
+                 (value, playlist_id, profile))
+
+
+def _delete_playlist(conn, profile, playlist_id):
+    conn.execute("DELETE FROM playlists WHERE id = ? AND profile = ?", (playlist_id, profile))
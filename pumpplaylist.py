@@ -1,29 +1,45 @@
 import streamlit as st
-import pandas as pd
 import random
-import base64
 import os
-import io
 import shutil
-import hashlib
-import unicodedata
+import time
+import uuid
 from typing import Optional
 
-def make_track_key(row):
-    base = f"{row['Track No#']}_{row['Song Title']}_{row['Artist']}_{row['Release']}"
-    return hashlib.md5(base.encode()).hexdigest()
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from catalog_loader import CatalogLoader
+from timing import RerunTimer, configure_logging, log_enabled
 
 # Page setup
 st.set_page_config(page_title="Pump Playlist Builder", page_icon="favicon.png", layout="wide")
 
+# --- Perf timing: ?perf=1 shows the sidebar panel, PUMP_PERF_LOG=1 logs each rerun ---
+show_perf_panel = st.query_params.get("perf") == "1"
+if log_enabled():
+    configure_logging()
+if 'perf_session' not in st.session_state:
+    st.session_state['perf_session'] = uuid.uuid4().hex[:12]
+st.session_state['perf_run'] = st.session_state.get('perf_run', 0) + 1
+perf = RerunTimer(enabled=show_perf_panel, log=log_enabled(),
+                  session=st.session_state['perf_session'], run=st.session_state['perf_run'])
+for name, seconds in st.session_state.pop('perf_callbacks', []):
+    perf.record(name, seconds)
+
 # Copy secrets for Render deployment
 if os.path.exists("/etc/secrets/secrets.toml"):
     os.makedirs(os.path.expanduser("~/.streamlit"), exist_ok=True)
     shutil.copy("/etc/secrets/secrets.toml", os.path.expanduser("~/.streamlit/secrets.toml"))
-import hashlib
 
 encoded_csv = st.secrets.get("csv_data")
 
+# --- Catalog: built on a background thread so the header renders before it's ready ---
+@st.cache_resource
+def get_catalog_loader():
+    return CatalogLoader()
+
+catalog_future = get_catalog_loader().get(encoded_csv)
+
 # --- Light/Dark mode styling ---
 st.markdown("""
     <style>
@@ -45,122 +61,69 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-@st.cache_data(ttl=3600)  # Cache for 1 hour
-def load_data(encoded_csv: Optional[str]):
-    if encoded_csv:
-        decoded_bytes = base64.b64decode(encoded_csv)
-        # Pass the raw bytes to pandas
-        try:
-            df = pd.read_csv(io.BytesIO(decoded_bytes), encoding="utf-8")
-        except UnicodeDecodeError:
-            df = pd.read_csv(io.BytesIO(decoded_bytes), encoding="cp1252")
-    else:
-        try:
-            df = pd.read_csv("BPdata_89_Current.csv", encoding="utf-8")
-        except UnicodeDecodeError:
-            df = pd.read_csv("BPdata_89_Current.csv", encoding="cp1252")
-
-    # --- Sorting key for releases ---
-    def sort_key(x):
-        if str(x) == "United":
-            return 113.5
-        try:
-            return float(x)
-        except:
-            return 0
-
-    df["SortKey"] = df["Release"].apply(sort_key)
-    df = df.sort_values("SortKey").reset_index(drop=True)
-
-    # --- Clean tags ---
-    def clean_tags(tag_str):
-        if pd.isna(tag_str) or str(tag_str).strip().lower() in ["nan", "none", "-"]:
-            return None
-        tags = [t.strip() for t in str(tag_str).split(",") if t.strip()]
-        replacements = {"Break-up Songs": "Break-Up Songs", "🌈": "✨"}
-        cleaned = [replacements.get(tag, tag) for tag in tags]
-        return ", ".join(sorted(set(cleaned))) if cleaned else None
-
-    df["Tags"] = df["Tags"].apply(clean_tags)
-
-    # --- Normalize text fields to fix accent issues ---
-    import unicodedata
-    for col in ["Song Title", "Artist", "Genre", "Tags"]:
-        if col in df.columns:
-            df[col] = df[col].apply(lambda x: unicodedata.normalize("NFC", str(x)))
-
-    return df
+# ---------------- Headers ----------------
+primary_color = "#667eea"
+secondary_color = "#4ecdc4"
+accent_color = "#ff6b6b"
 
-encoded_csv = st.secrets.get("csv_data")
-df = load_data(encoded_csv)
-
-# Track/Tag data
-track_types = [
-    "1 - Warmup", "2 - Squats", "3 - Chest", "4 - Back", "5 - Triceps",
-    "6 - Biceps", "7 - Lunges", "8 - Shoulders", "9 - Core", "10 - Cooldown"
-]
-
-tag_emojis = {
-    "Halloween": "🎃", "Women of Pop": "👩‍🎤", "Break-Up Songs": "💔",
-    "Beast Mode": "💪", "Positive Vibes": "✨", "Sing-Along": "🎤",
-    "Emo": "🎸", "P!nk": "💗", "New Year's Eve": "🥳", "Valentine's Day": "💘",
-    "Summer": "☀️", "Hard": "💀", "Easy to Learn": "😅",
-    "Short (<4:30)": "⏱️", "Long (>6 min)": "⌛"
-}
+st.markdown(f"""
+    <div class="header-gradient" style="text-align:center; padding:0.7rem 0.5rem 1.2rem 0.5rem;
+        background:linear-gradient(135deg, {primary_color}, {secondary_color});
+        color:white; border-radius:1rem;">
+        <h1 style='margin-bottom:0.5rem;'>🎵 Pump Playlist Builder <span style='pointer-events:none;'>💪</span></h1>
+        <p style='margin-top:0;'>Create your perfect Pump class lineup</p>
+    </div>
+""", unsafe_allow_html=True)
 
-# -------- Helpers --------
-def duration_to_sec(dur):
-    try:
-        m, s = map(int, str(dur).split(":"))
-        return m * 60 + s
-    except:
-        return 0
-
-def apply_search_filter(df, search_term):
-    """Apply search filter to dataframe with exact matching and artist name normalization"""
-    if not search_term or not search_term.strip():
-        return df
-    
-    search_lower = search_term.lower().strip()
-    
-    def normalize_for_search(text):
-        """Normalize text for better search matching"""
-        text = text.lower()
-        # Handle common artist name variations
-        text = text.replace('p!nk', 'pink')
-        text = text.replace('pink', 'p!nk pink')  # Allow both to match
-        # Add more normalizations as needed
-        return text
-    
-    def matches_search(row):
-        title = str(row.get('Song Title', '')).lower()
-        artist = str(row.get('Artist', '')).lower()
-        
-        # Normalize both search term and data for special character matching
-        normalized_search = normalize_for_search(search_lower)
-        normalized_title = normalize_for_search(title)
-        normalized_artist = normalize_for_search(artist)
-        
-        # Split search term into individual words for more precise matching
-        search_words = [word.strip() for word in search_lower.split() if word.strip()]
-        
-        # For multi-word searches (like "lady gaga"), require ALL words to be present
-        if len(search_words) > 1:
-            # Check if all words in the search term are present in title or artist
-            title_match = all(word in normalized_title for word in search_words)
-            artist_match = all(word in normalized_artist for word in search_words)
-            return title_match or artist_match
-        else:
-            # For single word searches, use the original substring matching
-            single_word = search_words[0] if search_words else search_lower
-            if (single_word in title or single_word in artist or
-                single_word in normalized_title or single_word in normalized_artist):
-                return True
-        
-        return False
-    
-    return df[df.apply(matches_search, axis=1)]
+st.markdown(f"""
+    <div class="step1-gradient" style="background:linear-gradient(135deg, #ffecd2, {accent_color});
+        padding:1.2rem 0.7rem; border-radius:15px; margin-top:1.2rem; margin-bottom:1.2rem;
+        box-shadow:0 4px 15px rgba(255,107,107,0.15);">
+        <h3 style="color:{primary_color}; margin:0; font-size:1.2rem;">
+            Feeling uninspired? Let's get you pumped! 🎵
+        </h3>
+        <div style='color:#333; font-size:1.05rem; margin-top:0.3rem;'>
+            Tell us about your back catalog and we'll help you build the perfect mix.
+        </div>
+    </div>
+""", unsafe_allow_html=True)
+
+# --- Data modules: importing pandas takes a few hundred ms on a cold process,
+# so it happens after the header is on screen (the catalog thread is already
+# importing them in the background) ---
+import pandas as pd
+
+from playlist_engine import (
+    track_types, tag_emojis, theme_tags, instructor_tags, placeholder_row,
+    current_release_of, duration_to_sec, filter_release_window,
+    apply_search_filter, build_playlist_batch, theme_index, theme_mask, partial_mask, slot_counts,
+    similar_tracks, build_random_playlist, build_theme_playlist,
+)
+from catalog_validation import summary_line
+from playlist_export import EXPORT_FORMATS, export_text, format_duration
+from playlist_store import PlaylistStore
+
+@st.cache_data(ttl=3600)
+def load_theme_index(encoded_csv: Optional[str], early_release, use_recent, avoid_current_release):
+    # Rows line up with filter_release_window() for the same Step 1 choices
+    catalog = get_catalog_loader().get(encoded_csv).result()
+    window = (early_release, use_recent, avoid_current_release)
+    if window == catalog.default_window:
+        return catalog.default_index  # built alongside the catalog
+    return theme_index(filter_release_window(catalog.df, *window))
+
+# --- Saved playlists: the profile id in the URL keeps a browser's history ---
+@st.cache_resource
+def get_store():
+    return PlaylistStore()
+
+store = get_store()
+profile = st.query_params.get("profile")
+if not profile:
+    profile = uuid.uuid4().hex[:12]
+    st.query_params["profile"] = profile
 
+# -------- Helpers --------
 def render_tags(row):
     tag_html = ""
     if row.get("Tags") not in [None, "-", "nan", "NaN", "None"] and not pd.isna(row.get("Tags")):
@@ -198,44 +161,391 @@ def render_tags(row):
             tag_html += f"<span style='background-color:{pill_color}; color:#222; padding:0.2rem 0.5rem; margin-right:5px; border-radius:10px; font-size:0.8rem'>{emoji} {display_tag}</span>"
     return tag_html
 
-def playlist_copy_export(playlist_df):
+def playlist_downloads(playlists, file_stem, key):
+    # Each file is built when its button is clicked (off the script thread)
+    # and cached on the playlists' contents. playlists can also be a function
+    # returning them, to put off building the frames until then too.
+    get_playlists = playlists if callable(playlists) else lambda: playlists
+    cols = st.columns(len(EXPORT_FORMATS))
+    for col, (label, extension, mime, build) in zip(cols, EXPORT_FORMATS):
+        with col:
+            st.download_button(f"⬇️ {label}", data=lambda build=build: build(get_playlists()),
+                               file_name=f"{file_stem}.{extension}", mime=mime,
+                               key=f"download_{extension}_{key}", on_click="ignore")
+
+def lazy_expander(label, key):
+    # Tracks whether it's open (opening it reruns the script), so callers can
+    # skip building its contents while it's closed
+    return st.expander(label, key=key, on_change="rerun")
+
+def playlist_copy_export(playlist_df, method):
+    playlists = [("Pump Playlist", playlist_df)]
+    export = lazy_expander("📋 Ready to teach it? Click to get a copy/paste version of your playlist.",
+                           f"copy_export_{method}")
+    if export.open:
+        with export:
+            st.code(export_text(playlists), language=None)
+            playlist_downloads(playlists, f"pump-playlist-{method}", method)
+
+# -------- Callbacks --------
+# Buttons and swap dropdowns update session state in on_click/on_change
+# callbacks, which run before the next script run, so a click costs one run
+# instead of a run plus an st.rerun().
+def timed_callback(name):
+    def wrap(fn):
+        def run(*args):
+            start = time.perf_counter()
+            fn(*args)
+            # Picked up by the next run's RerunTimer
+            st.session_state.setdefault('perf_callbacks', []).append((name, time.perf_counter() - start))
+        return run
+    return wrap
+
+def set_playlist_row(playlist_key, idx, new_row):
+    playlist_df = st.session_state[playlist_key]
+    for col in playlist_df.columns:
+        playlist_df.at[idx, col] = new_row[col]
+
+def selected_release_window(use_recent):
+    return filter_release_window(
+        df, st.session_state['early_release'], use_recent,
+        st.session_state['avoid_current_release'], current_release
+    )
+
+def without_playlist_songs(pool, playlist_key):
+    # A swap never brings in a song the playlist already has (SongKey ignores
+    # which release/slot it came from)
+    playlist_df = st.session_state[playlist_key]
+    if 'SongKey' not in playlist_df:
+        return pool
+    return pool[~pool['SongKey'].isin(playlist_df['SongKey'].dropna())]
+
+def random_swap_pool(track, title):
+    swap_pool = selected_release_window(False)
+    swap_pool = swap_pool[swap_pool['Track No#'] == track]
+    return without_playlist_songs(swap_pool[swap_pool['Song Title'] != title], 'random_playlist')
+
+def pick_similar(pool, track_id):
+    # A random one of the nearest few, so clicking again gives something new
+    return similar_tracks(catalog.similarity, pool, track_id).sample(1).iloc[0]
+
+@timed_callback("tab1.swap")
+def swap_random_track(idx, track, title):
+    swap_pool = random_swap_pool(track, title)
+    if not swap_pool.empty:
+        set_playlist_row('random_playlist', idx, swap_pool.sample(1).iloc[0])
+
+@timed_callback("tab1.similar")
+def swap_similar_random_track(idx, track, title, track_id):
+    swap_pool = random_swap_pool(track, title)
+    if not swap_pool.empty:
+        set_playlist_row('random_playlist', idx, pick_similar(swap_pool, track_id))
+
+@timed_callback("tab2.slot_random")
+def fill_theme_slot_random(idx, track):
+    # Get a completely random track for this position
+    random_pool = selected_release_window(st.session_state['use_recent'])
+    random_pool = without_playlist_songs(random_pool[random_pool['Track No#'] == track], 'theme_playlist')
+    if not random_pool.empty:
+        set_playlist_row('theme_playlist', idx, random_pool.sample(1).iloc[0])
+
+# The Theme tab's pools come from the slot's last render. Another slot may
+# have been swapped since (each slot is its own fragment), so the callbacks
+# drop the playlist's current songs again before picking.
+@timed_callback("tab2.slot_partial")
+def fill_theme_slot_partial(idx, pool, reset_used):
+    pool = without_playlist_songs(pool, 'theme_playlist')
+    if pool.empty:
+        return
+    if reset_used:
+        # All partial matches have been used, reset and start over
+        st.session_state['used_partial_tracks'].clear()
+    new_row = pool.sample(1).iloc[0]
+    st.session_state['used_partial_tracks'].add(new_row['TrackID'])
+    set_playlist_row('theme_playlist', idx, new_row)
+
+@timed_callback("tab2.swap")
+def swap_theme_track(idx, swap_pool):
+    track_id = st.session_state[f"theme_swap_select_{idx}"]
+    matches = without_playlist_songs(swap_pool[swap_pool['TrackID'] == track_id], 'theme_playlist')
+    if not matches.empty:
+        set_playlist_row('theme_playlist', idx, matches.iloc[0])
+
+@timed_callback("tab2.similar")
+def swap_similar_theme_track(idx, swap_pool, track_id):
+    swap_pool = without_playlist_songs(swap_pool, 'theme_playlist')
+    if not swap_pool.empty:
+        set_playlist_row('theme_playlist', idx, pick_similar(swap_pool, track_id))
+
+@timed_callback("tab3.add")
+def add_manual_track(track_type, track_id):
+    st.session_state['manual_selection'][track_type] = track_id
+    # Point the slot's dropdown at the added track
+    st.session_state[f"manual_{track_type}"] = track_id
+    st.toast(f"✅ Added to {track_type}!")
+
+@timed_callback("tab3.clear")
+def clear_manual_track(track):
+    st.session_state['manual_selection'].pop(track, None)
+    # Without widget state the dropdown falls back to its first option
+    st.session_state.pop(f"manual_{track}", None)
+
+@timed_callback("history.save")
+def save_playlist(playlist_key, method, taught):
+    # Queued; the store commits it in the background
+    store.save_playlist(profile, st.session_state[playlist_key], method, taught=taught, favorite=not taught)
+    st.toast("✅ Marked as taught today" if taught else "⭐ Saved to favorites")
+
+@timed_callback("history.favorite")
+def toggle_favorite(playlist_id, favorite):
+    store.set_favorite(profile, playlist_id, favorite)
+
+@timed_callback("history.taught")
+def mark_playlist_taught(playlist_id):
+    store.mark_taught(profile, playlist_id)
+    st.toast("✅ Marked as taught today")
+
+@timed_callback("history.delete")
+def delete_saved_playlist(playlist_id):
+    store.delete_playlist(profile, playlist_id)
+
+# -------- Playlist slots --------
+# Each slot is an st.fragment, so a swap or dropdown change reruns only that
+# slot. The total and export sit in st.empty() placeholders created by the
+# full run. A fragment can only write to an outside placeholder it already
+# wrote to during the full run, so every slot claims both on full runs (the
+# full run then fills them after the loop) and redraws them on its own reruns.
+def in_fragment_rerun():
+    # Streamlit lists the fragments it is rerunning on their own; a full run
+    # lists none, even one that stopped before reaching the end of the script
+    ctx = get_script_run_ctx()
+    return bool(ctx and ctx.fragment_ids_this_run)
+
+def fragment_span(name):
+    # A fragment rerun gets its own timer; give it the callback that triggered it
+    if in_fragment_rerun():
+        return perf.fragment(name, rerun=True, pending=st.session_state.pop('perf_callbacks', []))
+    return perf.fragment(name, rerun=False)
+
+def track_label(row):
+    # Dropdown text for a catalog row
+    return f"[{row['Release']}] {row['Song Title']} by {row['Artist']}"
+
+def render_playlist_card(row):
+    st.markdown(f"""
+        <div class="playlist-card" style="padding:1rem;margin-bottom:0.5rem;
+            border-left:5px solid #667eea;border-radius:8px">
+            <strong>{row['Track No#']} - {row['Song Title']}</strong> by {row['Artist']}<br>
+            <em><span>Release: <span class='release-number'>{row['Release']}</span></span> |
+            Duration: {row['Duration']} | Genre: {row['Genre']}</em><br>
+            {render_tags(row)}
+        </div>
+    """, unsafe_allow_html=True)
+
+def render_playlist_summary(playlist_df, total_box, export_box, method,
+                            total_format="### 🕒 Total Duration: **{}**"):
     total_sec = playlist_df['Duration'].apply(duration_to_sec).sum()
-    min_, sec = divmod(total_sec, 60)
-    with st.expander("📋 Ready to teach it? Click to get a copy/paste version of your playlist."):
-        copy_text = f"Pump Playlist - Total Time: {min_}:{str(sec).zfill(2)}\n"
-        for _, row in playlist_df.iterrows():
-            copy_text += f"{row['Release']} - {row['Track No#']}: {row['Song Title']} — {row['Artist']} ({row['Duration']})\n"
-        st.code(copy_text, language=None)
+    total_box.markdown(total_format.format(format_duration(total_sec)))
+    with export_box.container():
+        playlist_copy_export(playlist_df, method)
 
-# ---------------- Headers ----------------
-primary_color = "#667eea"
-secondary_color = "#4ecdc4"
-accent_color = "#ff6b6b"
+def claim_summary(total_box, export_box):
+    total_box.empty()
+    export_box.empty()
 
-st.markdown(f"""
-    <div class="header-gradient" style="text-align:center; padding:0.7rem 0.5rem 1.2rem 0.5rem;
-        background:linear-gradient(135deg, {primary_color}, {secondary_color});
-        color:white; border-radius:1rem;">
-        <h1 style='margin-bottom:0.5rem;'>🎵 Pump Playlist Builder <span style='pointer-events:none;'>💪</span></h1>
-        <p style='margin-top:0;'>Create your perfect Pump class lineup</p>
-    </div>
-""", unsafe_allow_html=True)
+@st.fragment
+def random_slot(idx, total_box, export_box):
+    with fragment_span("tab1.slot"):
+        playlist_df = st.session_state['random_playlist']
+        row = playlist_df.loc[idx]
+        col1, col2 = st.columns([6, 1])
+        with col1:
+            render_playlist_card(row)
+        with col2:
+            st.button("Swap for another random track", key=f"swap_random_{idx}",
+                      on_click=swap_random_track, args=(idx, row['Track No#'], row['Song Title']))
+            if pd.notna(row['TrackID']):
+                st.button("✨ Something similar", key=f"swap_similar_{idx}",
+                          on_click=swap_similar_random_track,
+                          args=(idx, row['Track No#'], row['Song Title'], row['TrackID']))
+        if in_fragment_rerun():
+            render_playlist_summary(playlist_df, total_box, export_box, "random")
+        else:
+            claim_summary(total_box, export_box)
 
-st.markdown(f"""
-    <div class="step1-gradient" style="background:linear-gradient(135deg, #ffecd2, {accent_color});
-        padding:1.2rem 0.7rem; border-radius:15px; margin-top:1.2rem; margin-bottom:1.2rem;
-        box-shadow:0 4px 15px rgba(255,107,107,0.15);">
-        <h3 style="color:{primary_color}; margin:0; font-size:1.2rem;">
-            Feeling uninspired? Let's get you pumped! 🎵
-        </h3>
-        <div style='color:#333; font-size:1.05rem; margin-top:0.3rem;'>
-            Tell us about your back catalog and we'll help you build the perfect mix.
-        </div>
-    </div>
-""", unsafe_allow_html=True)
+@st.fragment
+def theme_slot(idx, partial_window, theme_window, total_box, export_box):
+    with fragment_span("tab2.slot"):
+        playlist_df = st.session_state['theme_playlist']
+        row = playlist_df.loc[idx]
+        col1, col2 = st.columns([6, 2])
+        with col1:
+            render_playlist_card(row)
+        with col2:
+            # Check if this is a "no themed track available" slot
+            if row['Song Title'] == "⚠️ No themed track available":
+                st.markdown("**No themed track available**")
+
+                # Create options for partial matches
+                col_a, col_b = st.columns(2)
+
+                with col_a:
+                    st.button("🎲 Random track", key=f"slot_random_{idx}",
+                              on_click=fill_theme_slot_random, args=(idx, row['Track No#']))
+
+                with col_b:
+                    # Check if we have any partial matches (tracks that match at least one tag)
+                    if partial_window is not None:
+                        partial_pool = partial_window[partial_window['Track No#'] == row['Track No#']]
+                        partial_pool = without_playlist_songs(partial_pool, 'theme_playlist')
+
+                        # Filter out tracks we've already used for partial matches
+                        unused_partial_pool = partial_pool[~partial_pool['TrackID'].isin(st.session_state['used_partial_tracks'])]
+
+                        if not unused_partial_pool.empty:
+                            st.button("🎯 Partial match", key=f"slot_partial_{idx}",
+                                      on_click=fill_theme_slot_partial, args=(idx, unused_partial_pool, False))
+                        elif not partial_pool.empty:
+                            # All partial matches have been used, reset and start over
+                            st.button("🎯 Reset partial matches", key=f"slot_reset_{idx}",
+                                      on_click=fill_theme_slot_partial, args=(idx, partial_pool, True))
+                        else:
+                            st.button("🎯 No partial matches", key=f"slot_none_{idx}", disabled=True)
+                    else:
+                        st.button("🎯 No tags selected", key=f"slot_none_{idx}", disabled=True)
+            else:
+                swap_pool = theme_window[theme_window['Track No#'] == row['Track No#']]
+                swap_pool = without_playlist_songs(swap_pool[swap_pool['Song Title'] != row['Song Title']], 'theme_playlist')
+
+                num_options = len(swap_pool)
+
+                if num_options > 0:
+                    # Most similar to the current track first
+                    swap_pool = similar_tracks(catalog.similarity, swap_pool, row['TrackID'], k=None)
+                    swap_label = f"Swap {row['Track No#']} ({num_options} other tracks with your theme, most similar first)"
+                    # Options are TrackIDs, the current track first: titles
+                    # aren't unique within a slot
+                    display_names = {row['TrackID']: track_label(row)}
+                    display_names.update((r['TrackID'], track_label(r)) for _, r in swap_pool.iterrows())
+
+                    # The dropdown always shows the track currently in the slot;
+                    # picking another one swaps it in via the on_change callback
+                    st.session_state[f"theme_swap_select_{idx}"] = row['TrackID']
+                    st.selectbox(
+                        swap_label,
+                        list(display_names),
+                        format_func=display_names.get,
+                        key=f"theme_swap_select_{idx}",
+                        on_change=swap_theme_track,
+                        args=(idx, swap_pool)
+                    )
+                    st.button("✨ Something similar", key=f"theme_similar_{idx}",
+                              on_click=swap_similar_theme_track, args=(idx, swap_pool, row['TrackID']))
+
+                else:
+                    st.button("No alternatives", key=f"theme_no_options_{idx}", disabled=True)
+        if in_fragment_rerun():
+            render_playlist_summary(playlist_df, total_box, export_box, "theme")
+        else:
+            claim_summary(total_box, export_box)
+
+def render_save_buttons(playlist_key, method):
+    col1, col2 = st.columns(2)
+    with col1:
+        st.button("✅ I taught this today", key=f"taught_{method}",
+                  on_click=save_playlist, args=(playlist_key, method, True))
+    with col2:
+        st.button("⭐ Save to favorites", key=f"favorite_{method}",
+                  on_click=save_playlist, args=(playlist_key, method, False))
+
+SAVED_TRACK_COLUMNS = {'track_id': 'TrackID', 'track_no': 'Track No#', 'song_title': 'Song Title',
+                       'artist': 'Artist', 'release': 'Release', 'duration': 'Duration'}
+
+def saved_playlist_df(saved):
+    playlist_df = pd.DataFrame(saved['tracks'], columns=list(SAVED_TRACK_COLUMNS)).rename(columns=SAVED_TRACK_COLUMNS)
+    # Genre and tags come from the catalog, for tracks that are still in it
+    return playlist_df.join(df.set_index('TrackID')[['Genre', 'Tags']], on='TrackID')
+
+def without_recently_taught(window):
+    # An indexed lookup in the store, not a scan of the saved playlists
+    if not skip_taught_weeks:
+        return window
+    taught = store.recently_taught(profile, skip_taught_weeks * 7)
+    return window[~window['TrackID'].isin(taught)] if taught else window
+
+def render_custom_summary(display_filtered_df, total_box, export_box):
+    # Build final playlist from session state
+    manual_selection = st.session_state.get('manual_selection', {})
+    rows_by_id = display_filtered_df.set_index('TrackID', drop=False)
+    playlist_rows = []
+    playlist_ids = []
+    for track in track_types:
+        if manual_selection.get(track) in rows_by_id.index:
+            playlist_rows.append(rows_by_id.loc[manual_selection[track]])
+            playlist_ids.append(manual_selection[track])
+        else:
+            # Default to first available track or empty
+            track_df = display_filtered_df[display_filtered_df['Track No#'] == track]
+            if not track_df.empty:
+                playlist_rows.append(track_df.iloc[0])
+                playlist_ids.append(track_df['TrackID'].iat[0])
+            else:
+                playlist_rows.append(pd.Series(placeholder_row(track)))
+                playlist_ids.append(pd.NA)
+
+    playlist_df = pd.DataFrame(playlist_rows).reset_index(drop=True)
+    # With a placeholder row the frame's TrackID column is float; take the
+    # IDs from the selection instead, as assemble_playlist does
+    playlist_df['TrackID'] = pd.array(playlist_ids, dtype="Int64")
+    st.session_state['custom_playlist'] = playlist_df
+    render_playlist_summary(playlist_df, total_box, export_box, "custom",
+                            total_format="**🕒 Total Duration: {}**")
+
+@st.fragment
+def manual_slot(track, display_filtered_df, total_box, export_box):
+    with fragment_span("tab3.slot"):
+        track_df = display_filtered_df[display_filtered_df['Track No#'] == track]
+
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            if not track_df.empty:
+                display_names = {row['TrackID']: track_label(row) for _, row in track_df.iterrows()}
+
+                # Options are TrackIDs; the ➕ and 🗑️ callbacks move the
+                # selection by setting this widget's state
+                selected_id = st.selectbox(
+                    track,
+                    list(display_names),
+                    format_func=display_names.get,
+                    key=f"manual_{track}"
+                )
+
+                # Update session state with the selected track
+                st.session_state['manual_selection'][track] = selected_id
+            else:
+                st.selectbox(track, ["⚠️ No tracks available"], key=f"manual_{track}")
+                st.session_state['manual_selection'].pop(track, None)
+
+        with col2:
+            # Clear selection button
+            st.button("🗑️", key=f"clear_{track}", help=f"Reset to first option",
+                      on_click=clear_manual_track, args=(track,))
+        if in_fragment_rerun():
+            render_custom_summary(display_filtered_df, total_box, export_box)
+        else:
+            claim_summary(total_box, export_box)
+
+# ---------------- Catalog ----------------
+# Everything above renders without the data; wait here for the background build
+with perf.span("load_data"):
+    if not catalog_future.done():
+        with st.spinner("Loading the track catalog..."):
+            catalog_future.result()
+    catalog = catalog_future.result()
+    df = catalog.df
 
 # ---------------- Step 1 ----------------
-current_release = str(df.loc[df['SortKey'].idxmax(), 'Release'])
+current_release = current_release_of(df)
 
 st.markdown("### Step 1: What's the earliest release you own?")
 avoid_current_release = st.checkbox(
@@ -247,83 +557,69 @@ use_recent = st.checkbox(
 available_releases = df['Release'].astype(str).unique().tolist()
 early_release = st.selectbox("Select your earliest release", available_releases, key="early_release")
 
+# Soft preferences: these shift the odds for the Random and Theme builders
+# instead of filtering tracks out
+recency_options = {"Older favorites": -3.0, "A bit older": -1.5, "Balanced": 0.0,
+                   "A bit newer": 1.5, "Newer releases": 3.0}
+difficulty_options = {"Any": None, "Easy to Learn": "Easy to Learn", "Hard Workout": "Hard"}
+with st.expander("🎛️ Fine-tune the mix (optional)"):
+    col1, col2 = st.columns(2)
+    with col1:
+        recency_choice = st.select_slider("Release age", options=list(recency_options),
+                                          value="Balanced", key="mix_recency")
+        favored_genres = st.multiselect("Favor genres", options=sorted(df['Genre'].dropna().unique().tolist()),
+                                        key="mix_genres", placeholder="Any genre")
+        difficulty_choice = st.radio("Favor difficulty", list(difficulty_options),
+                                     horizontal=True, key="mix_difficulty")
+    with col2:
+        max_per_release = st.number_input("Max tracks from one release (0 = no limit)",
+                                          min_value=0, max_value=10, value=0, key="mix_max_per_release")
+        unique_artist = st.checkbox("No repeated artists", key="mix_unique_artist")
+        skip_taught_weeks = st.number_input("Skip tracks I taught in the last N weeks (0 = off)",
+                                            min_value=0, max_value=52, value=0, key="mix_skip_taught_weeks",
+                                            help="Uses the playlists you mark with ✅ I taught this today")
+mix_preferences = {
+    "recency": recency_options[recency_choice],
+    "genre_mix": {genre: 1.0 for genre in favored_genres} or None,
+    "difficulty": difficulty_options[difficulty_choice],
+    "max_per_release": max_per_release or None,
+    "unique_artist": unique_artist,
+}
+
 # ---------------- Step 2 ----------------
 st.markdown("### Step 2: Pick your method and build your playlist")
-tab1, tab2, tab3 = st.tabs(["🎲 Random", "👻 Theme", "🛠️ Custom/Search"])
+tab1, tab2, tab3, tab4 = st.tabs(["🎲 Random", "👻 Theme", "🛠️ Custom/Search", "📚 My Playlists"])
 
 # ---------- Tab 1: Random ----------
-with tab1:
+with tab1, perf.span("tab1"):
     st.markdown("Generate a full playlist in one click, totally randomized from your library.")
     if 'random_playlist' not in st.session_state:
         st.session_state['random_playlist'] = None
     if st.button("🎲 Build My Random Playlist", key="build_random"):
-        selected_sort = df[df['Release'].astype(str) == str(early_release)]['SortKey'].iloc[0]
-        filtered_df = df[df['SortKey'] >= selected_sort]
-        if use_recent:
-            top_10 = df['SortKey'].drop_duplicates().nlargest(10)
-            filtered_df = filtered_df[filtered_df['SortKey'].isin(top_10)]
-        if avoid_current_release:
-            filtered_df = filtered_df[filtered_df['Release'].astype(str) != str(current_release)]
-
-        playlist = []
-        for track in track_types:
-            track_df = filtered_df[filtered_df['Track No#'] == track]
-            if not track_df.empty:
-                playlist.append(track_df.sample(1))
-            else:
-                playlist.append(pd.DataFrame([{
-                    "Track No#": track, "Song Title": "⚠️ No match found", "Artist": "-",
-                    "Release": "-", "Duration": "-", "Genre": "-", "Tags": "-"
-                }]))
-        st.session_state['random_playlist'] = pd.concat(playlist, ignore_index=True)
+        with perf.span("tab1.build"):
+            filtered_df = filter_release_window(df, early_release, use_recent, avoid_current_release, current_release)
+            filtered_df = without_recently_taught(filtered_df)
+            st.session_state['random_playlist'] = build_random_playlist(filtered_df, mix_preferences)
 
     if st.session_state['random_playlist'] is not None:
         playlist_df = st.session_state['random_playlist']
-        total_sec = playlist_df['Duration'].apply(duration_to_sec).sum()
-        min_, sec = divmod(total_sec, 60)
-        st.markdown(f"### 🕒 Total Duration: **{min_}:{str(sec).zfill(2)}**")
-
-        for idx, row in playlist_df.iterrows():
-            col1, col2 = st.columns([6, 1])
-            with col1:
-                st.markdown(f"""
-                    <div class="playlist-card" style="padding:1rem;margin-bottom:0.5rem;
-                        border-left:5px solid #667eea;border-radius:8px">
-                        <strong>{row['Track No#']} - {row['Song Title']}</strong> by {row['Artist']}<br>
-                        <em><span>Release: <span class='release-number'>{row['Release']}</span></span> |
-                        Duration: {row['Duration']} | Genre: {row['Genre']}</em><br>
-                        {render_tags(row)}
-                    </div>
-                """, unsafe_allow_html=True)
-            with col2:
-                if st.button("Swap for another random track", key=f"swap_random_{idx}"):
-                    selected_sort = df[df['Release'].astype(str) == str(early_release)]['SortKey'].iloc[0]
-                    swap_pool = df[(df['SortKey'] >= selected_sort) & (df['Track No#'] == row['Track No#'])]
-                    if avoid_current_release:
-                        swap_pool = swap_pool[swap_pool['Release'].astype(str) != str(current_release)]
-                    swap_pool = swap_pool[swap_pool['Song Title'] != row['Song Title']]
-                    if not swap_pool.empty:
-                        new_row = swap_pool.sample(1).iloc[0]
-                        for col in playlist_df.columns:
-                            playlist_df.at[idx, col] = new_row[col]
-                        st.session_state['random_playlist'] = playlist_df
-                        st.rerun()
-
-        st.session_state['random_playlist'] = playlist_df
-        playlist_copy_export(playlist_df)
+        total_box = st.empty()
+        slots = st.container()
+        export_box = st.empty()
+        with slots:
+            for idx in playlist_df.index:
+                random_slot(idx, total_box, export_box)
+        render_playlist_summary(playlist_df, total_box, export_box, "random")
+        render_save_buttons('random_playlist', "random")
 
 # ---------- Tab 2: Theme ----------
-with tab2:
+with tab2, perf.span("tab2"):
     st.markdown("Mix and match themes (like Halloween or Positive Vibes), track difficulty, song length, and genres to create your perfect playlist!")
     st.markdown("*💡 All filters are optional - pick just one or combine multiple!*")
 
     # Separate theme tags from instructor tags
     all_tags = sorted(set(tag.strip() for tags in df['Tags'].dropna() for tag in tags.split(',') if tag.strip()))
     
-    theme_tags = ["Beast Mode", "Break-Up Songs", "Emo", "Halloween", "New Year's Eve", "P!nk", 
-                  "Positive Vibes", "Sing-Along", "Summer", "Valentine's Day", "Women of Pop"]
-    instructor_tags = ["Easy to Learn", "Hard", "Short (<4:30)", "Long (>6 min)"]
-    
     # Filter available tags to only show those that exist in the data
     available_theme_tags = [tag for tag in theme_tags if tag in all_tags]
     available_instructor_tags = [tag for tag in instructor_tags if tag in all_tags]
@@ -357,241 +653,62 @@ with tab2:
     available_genres = sorted(df['Genre'].dropna().unique().tolist())
     selected_genres = st.multiselect("Genres", options=available_genres, key="theme_genres", placeholder="Select genres")
 
+    # Live per-slot availability for the current filters, from the cached index
+    with perf.span("tab2.availability"):
+        availability = load_theme_index(encoded_csv, early_release, use_recent, avoid_current_release)
+        theme_rows = theme_mask(availability, selected_theme_tags, selected_instructor_tags, selected_genres)
+        partial_rows = partial_mask(availability, selected_tags) if selected_tags else None
+    if selected_tags or selected_genres:
+        counts = slot_counts(availability, theme_rows)
+        st.markdown("**Matching tracks per slot:** " + " · ".join(
+            f"{track.split(' - ', 1)[1]} **{n}**" + (" ⚠️" if n == 0 else "") for track, n in counts.items()
+        ))
+        empty_slots = counts.index[counts == 0]
+        if len(empty_slots):
+            fill_hint = "🎲 Random track"
+            if partial_rows is not None:
+                partial_counts = slot_counts(availability, partial_rows)
+                fill_hint += " or 🎯 Partial match (" + ", ".join(
+                    f"{track.split(' - ', 1)[1]}: {partial_counts[track]}" for track in empty_slots
+                ) + " tracks with any of your tags)"
+            st.warning(f"No tracks match every filter for {', '.join(empty_slots)}. "
+                       f"After building, fill those slots with {fill_hint}.")
+    with st.expander("📊 Tracks per theme and slot in your releases"):
+        short_names = {track: track.split(' - ', 1)[1] for track in track_types}
+        tag_counts = availability["tag_counts"]
+        st.dataframe(tag_counts[tag_counts.sum(axis=1) > 0].rename(columns=short_names))
+        st.dataframe(availability["genre_counts"].rename(columns=short_names))
+
     if 'theme_playlist' not in st.session_state:
         st.session_state['theme_playlist'] = None
 
     if st.button("👻 Build My Themed Playlist", key="build_theme"):
         # Clear used partial tracks when building a new playlist
         st.session_state['used_partial_tracks'] = set()
-        selected_sort = df[df['Release'].astype(str) == str(early_release)]['SortKey'].iloc[0]
-        release_filtered_df = df[df['SortKey'] >= selected_sort]
-        if use_recent:
-            top_10 = df['SortKey'].drop_duplicates().nlargest(10)
-            release_filtered_df = release_filtered_df[release_filtered_df['SortKey'].isin(top_10)]
-        if avoid_current_release:
-            release_filtered_df = release_filtered_df[release_filtered_df['Release'].astype(str) != str(current_release)]
-
-        filtered_df = release_filtered_df.copy()
-        if selected_theme_tags or selected_instructor_tags:
-            def has_matching_tags(tag_str):
-                if pd.isna(tag_str) or tag_str in ["", "None", None]:
-                    return False
-                track_tags = [t.strip() for t in str(tag_str).split(",") if t.strip()]
-                
-                # Check if track has at least one theme tag (if any theme tags selected)
-                has_theme_tag = True
-                if selected_theme_tags:
-                    has_theme_tag = any(tag in track_tags for tag in selected_theme_tags)
-                
-                # Check if track has at least one instructor tag (if any instructor tags selected)
-                has_instructor_tag = True
-                if selected_instructor_tags:
-                    has_instructor_tag = any(tag in track_tags for tag in selected_instructor_tags)
-                
-                # Track must have both types if both are selected, or just the selected type
-                return has_theme_tag and has_instructor_tag
-            
-            filtered_df = filtered_df[filtered_df['Tags'].apply(has_matching_tags)]
-        if selected_genres:
-            filtered_df = filtered_df[filtered_df['Genre'].isin(selected_genres)]
-
-        playlist = []
-        used_tracks = set()  # Track which themed tracks we've already used
-        
-        # Initialize used partial tracks in session state
-        if 'used_partial_tracks' not in st.session_state:
-            st.session_state['used_partial_tracks'] = set()
-        
-        for track in track_types:
-            track_df = filtered_df[filtered_df['Track No#'] == track]
-            if not track_df.empty:
-                # Filter out tracks we've already used
-                available_tracks = track_df[~track_df['Song Title'].isin(used_tracks)]
-                if not available_tracks.empty:
-                    selected_track = available_tracks.sample(1)
-                    used_tracks.add(selected_track.iloc[0]['Song Title'])
-                    playlist.append(selected_track)
-                else:
-                    # No unused themed tracks for this position
-                    playlist.append(pd.DataFrame([{
-                        "Track No#": track, "Song Title": "⚠️ No themed track available", "Artist": "-",
-                        "Release": "-", "Duration": "-", "Genre": "-", "Tags": "-"
-                    }]))
-            else:
-                # If no themed tracks for this position, show "no themed track available"
-                # Don't reassign tracks from other positions as it breaks workout structure
-                playlist.append(pd.DataFrame([{
-                    "Track No#": track, "Song Title": "⚠️ No themed track available", "Artist": "-",
-                    "Release": "-", "Duration": "-", "Genre": "-", "Tags": "-"
-                }]))
-        st.session_state['theme_playlist'] = pd.concat(playlist, ignore_index=True)
+        with perf.span("tab2.build"):
+            release_filtered_df = filter_release_window(df, early_release, use_recent, avoid_current_release, current_release)
+            filtered_df = without_recently_taught(release_filtered_df[theme_rows])
+            st.session_state['theme_playlist'] = build_theme_playlist(filtered_df, mix_preferences)
 
     if st.session_state.get('theme_playlist') is not None:
         playlist_df = st.session_state['theme_playlist']
-        total_sec = playlist_df['Duration'].apply(duration_to_sec).sum()
-        min_, sec = divmod(total_sec, 60)
-        st.markdown(f"### 🕒 Total Duration: **{min_}:{str(sec).zfill(2)}**")
-
-        for idx, row in playlist_df.iterrows():
-            col1, col2 = st.columns([6, 2])
-            with col1:
-                st.markdown(f"""
-                    <div class="playlist-card" style="padding:1rem;margin-bottom:0.5rem;
-                        border-left:5px solid #667eea;border-radius:8px">
-                        <strong>{row['Track No#']} - {row['Song Title']}</strong> by {row['Artist']}<br>
-                        <em><span>Release: <span class='release-number'>{row['Release']}</span></span> |
-                        Duration: {row['Duration']} | Genre: {row['Genre']}</em><br>
-                        {render_tags(row)}
-                    </div>
-                """, unsafe_allow_html=True)
-            with col2:
-                # Check if this is a "no themed track available" slot
-                if row['Song Title'] == "⚠️ No themed track available":
-                    st.markdown("**No themed track available**")
-                    
-                    # Create options for partial matches
-                    col_a, col_b = st.columns(2)
-                    
-                    with col_a:
-                        if st.button("🎲 Random track", key=f"slot_random_{idx}"):
-                            # Get a completely random track for this position
-                            selected_sort = df[df['Release'].astype(str) == str(early_release)]['SortKey'].iloc[0]
-                            random_pool = df[(df['SortKey'] >= selected_sort) & (df['Track No#'] == row['Track No#'])]
-                            if use_recent:
-                                top_10 = df['SortKey'].drop_duplicates().nlargest(10)
-                                random_pool = random_pool[random_pool['SortKey'].isin(top_10)]
-                            if avoid_current_release:
-                                random_pool = random_pool[random_pool['Release'].astype(str) != str(current_release)]
-                            
-                            if not random_pool.empty:
-                                new_row = random_pool.sample(1).iloc[0]
-                                for col in playlist_df.columns:
-                                    playlist_df.at[idx, col] = new_row[col]
-                                st.rerun()
-                    
-                    with col_b:
-                        # Check if we have any partial matches (tracks that match at least one tag)
-                        if selected_theme_tags or selected_instructor_tags:
-                            selected_sort = df[df['Release'].astype(str) == str(early_release)]['SortKey'].iloc[0]
-                            partial_pool = df[(df['SortKey'] >= selected_sort) & (df['Track No#'] == row['Track No#'])]
-                            if use_recent:
-                                top_10 = df['SortKey'].drop_duplicates().nlargest(10)
-                                partial_pool = partial_pool[partial_pool['SortKey'].isin(top_10)]
-                            if avoid_current_release:
-                                partial_pool = partial_pool[partial_pool['Release'].astype(str) != str(current_release)]
-                            
-                            # Filter for tracks that match at least one tag (OR logic)
-                            def has_any_matching_tag(tag_str):
-                                if pd.isna(tag_str) or tag_str in ["", "None", None]:
-                                    return False
-                                track_tags = [t.strip() for t in str(tag_str).split(",") if t.strip()]
-                                all_selected_tags = selected_theme_tags + selected_instructor_tags
-                                return any(tag in track_tags for tag in all_selected_tags)
-                            
-                            partial_pool = partial_pool[partial_pool['Tags'].apply(has_any_matching_tag)]
-                            
-                            # Filter out tracks we've already used for partial matches
-                            unused_partial_pool = partial_pool[~partial_pool['Song Title'].isin(st.session_state['used_partial_tracks'])]
-                            
-                            if not unused_partial_pool.empty:
-                                if st.button("🎯 Partial match", key=f"slot_partial_{idx}"):
-                                    new_row = unused_partial_pool.sample(1).iloc[0]
-                                    st.session_state['used_partial_tracks'].add(new_row['Song Title'])
-                                    for col in playlist_df.columns:
-                                        playlist_df.at[idx, col] = new_row[col]
-                                    st.rerun()
-                            elif not partial_pool.empty:
-                                # All partial matches have been used, reset and start over
-                                if st.button("🎯 Reset partial matches", key=f"slot_reset_{idx}"):
-                                    st.session_state['used_partial_tracks'].clear()
-                                    new_row = partial_pool.sample(1).iloc[0]
-                                    st.session_state['used_partial_tracks'].add(new_row['Song Title'])
-                                    for col in playlist_df.columns:
-                                        playlist_df.at[idx, col] = new_row[col]
-                                    st.rerun()
-                            else:
-                                st.button("🎯 No partial matches", key=f"slot_none_{idx}", disabled=True)
-                        else:
-                            st.button("🎯 No tags selected", key=f"slot_none_{idx}", disabled=True)
-                else:
-                    # Recreate the filtered data for swap options
-                    selected_sort = df[df['Release'].astype(str) == str(early_release)]['SortKey'].iloc[0]
-                    release_filtered_df = df[df['SortKey'] >= selected_sort]
-                    if use_recent:
-                        top_10 = df['SortKey'].drop_duplicates().nlargest(10)
-                        release_filtered_df = release_filtered_df[release_filtered_df['SortKey'].isin(top_10)]
-                    if avoid_current_release:
-                        release_filtered_df = release_filtered_df[release_filtered_df['Release'].astype(str) != str(current_release)]
-
-                    # Apply theme/genre filters
-                    swap_filtered_df = release_filtered_df.copy()
-                    if selected_theme_tags or selected_instructor_tags:
-                        def has_matching_tags(tag_str):
-                            if pd.isna(tag_str) or tag_str in ["", "None", None]:
-                                return False
-                            track_tags = [t.strip() for t in str(tag_str).split(",") if t.strip()]
-                            
-                            # Check if track has at least one theme tag (if any theme tags selected)
-                            has_theme_tag = True
-                            if selected_theme_tags:
-                                has_theme_tag = any(tag in track_tags for tag in selected_theme_tags)
-                            
-                            # Check if track has at least one instructor tag (if any instructor tags selected)
-                            has_instructor_tag = True
-                            if selected_instructor_tags:
-                                has_instructor_tag = any(tag in track_tags for tag in selected_instructor_tags)
-                            
-                            # Track must have both types if both are selected, or just the selected type
-                            return has_theme_tag and has_instructor_tag
-                        
-                        swap_filtered_df = swap_filtered_df[swap_filtered_df['Tags'].apply(has_matching_tags)]
-                    if selected_genres:
-                        swap_filtered_df = swap_filtered_df[swap_filtered_df['Genre'].isin(selected_genres)]
-
-                    swap_pool = swap_filtered_df[swap_filtered_df['Track No#'] == row['Track No#']]
-                    swap_pool = swap_pool[swap_pool['Song Title'] != row['Song Title']]
-
-                    num_options = len(swap_pool)
-                    option_word = "option" if num_options == 1 else "options"
-
-                    if num_options > 0:
-                        swap_label = f"Swap {row['Track No#']} ({num_options} other tracks with your theme)"
-                        options = [f"[{r['Release']}] {r['Song Title']} by {r['Artist']}" for _, r in swap_pool.iterrows()]
-                        current_track = f"[{row['Release']}] {row['Song Title']} by {row['Artist']}"
-                        
-                        # Add current track to the beginning of options if not already there
-                        if current_track not in options:
-                            options = [current_track] + options
-                        
-                        # Initialize session state for this selectbox if not exists
-                        if f"theme_swap_select_{idx}" not in st.session_state:
-                            st.session_state[f"theme_swap_select_{idx}"] = current_track
-                        
-                        selected_option = st.selectbox(
-                            swap_label,
-                            options,
-                            index=options.index(st.session_state[f"theme_swap_select_{idx}"]) if st.session_state[f"theme_swap_select_{idx}"] in options else 0,
-                            key=f"theme_swap_select_{idx}"
-                        )
-                        
-                        # Check if selection changed and update playlist
-                        if selected_option != current_track:
-                            new_title = selected_option.split("] ", 1)[1].rsplit(" by ", 1)[0]
-                            new_row = swap_pool[swap_pool['Song Title'] == new_title].iloc[0]
-                            for col in playlist_df.columns:
-                                playlist_df.at[idx, col] = new_row[col]
-                            st.session_state['theme_playlist'] = playlist_df
-                            st.rerun()
-                        
-                    else:
-                        st.button("No alternatives", key=f"theme_no_options_{idx}", disabled=True)
-
-
-        st.session_state['theme_playlist'] = playlist_df
-        playlist_copy_export(playlist_df)
+        # The swap and partial-match pools share these filters, so build them once
+        with perf.span("tab2.swap_options"):
+            release_filtered_df = filter_release_window(df, early_release, use_recent, avoid_current_release, current_release)
+            swap_filtered_df = release_filtered_df[theme_rows]
+            partial_window = release_filtered_df[partial_rows] if partial_rows is not None else None
+
+        total_box = st.empty()
+        slots = st.container()
+        export_box = st.empty()
+        with slots:
+            for idx in playlist_df.index:
+                theme_slot(idx, partial_window, swap_filtered_df, total_box, export_box)
+        render_playlist_summary(playlist_df, total_box, export_box, "theme")
+        render_save_buttons('theme_playlist', "theme")
 
 # ---------- Tab 3: Custom ----------
-with tab3:
+with tab3, perf.span("tab3"):
     st.markdown("Browse all your available options for each track and build your playlist manually.")
     
     # Create two columns: left for search, right for playlist builder
@@ -601,13 +718,7 @@ with tab3:
     if 'manual_selection' not in st.session_state:
         st.session_state['manual_selection'] = {}
     
-    selected_sort = df[df['Release'].astype(str) == str(early_release)]['SortKey'].iloc[0]
-    filtered_df = df[df['SortKey'] >= selected_sort]
-    if use_recent:
-        top_10 = df['SortKey'].drop_duplicates().nlargest(10)
-        filtered_df = filtered_df[filtered_df['SortKey'].isin(top_10)]
-    if avoid_current_release:
-        filtered_df = filtered_df[filtered_df['Release'].astype(str) != str(current_release)]
+    filtered_df = filter_release_window(df, early_release, use_recent, avoid_current_release, current_release)
 
     # Left column: Search functionality
     with search_col:
@@ -621,7 +732,8 @@ with tab3:
         
         # Apply search filter if search term is provided
         if search_term and search_term.strip():
-            search_results = apply_search_filter(filtered_df, search_term)
+            with perf.span("tab3.search"):
+                search_results = apply_search_filter(filtered_df, search_term)
             
             # Show search results if there's a search term
             if not search_results.empty:
@@ -646,12 +758,9 @@ with tab3:
                                     """, unsafe_allow_html=True)
                                 with col2:
                                     # Add button to add this track to the playlist
-                                    track_key = make_track_key(row)
-                                    if st.button("➕", key=f"add_search_{track_key}", 
-                                               help=f"Add this track to the {track_type} position"):
-                                        st.session_state['manual_selection'][track_type] = row
-                                        st.success(f"✅ Added to {track_type}!")
-                                        st.rerun()
+                                    st.button("➕", key=f"add_search_{row['TrackID']}",
+                                              help=f"Add this track to the {track_type} position",
+                                              on_click=add_manual_track, args=(track_type, row['TrackID']))
             else:
                 st.markdown("**🔍 No results found**")
                 st.info(f"No tracks found matching '{search_term}'. Try different keywords, check your spelling, or try searching for partial words.")
@@ -665,95 +774,83 @@ with tab3:
 
         # Use the full filtered_df for dropdowns (not search results)
         display_filtered_df = filtered_df
-        if search_term and search_term.strip():
-            # Reset display_filtered_df to full filtered set for dropdowns
-            display_filtered_df = df[df['SortKey'] >= selected_sort]
-            if use_recent:
-                top_10 = df['SortKey'].drop_duplicates().nlargest(10)
-                display_filtered_df = display_filtered_df[display_filtered_df['SortKey'].isin(top_10)]
-            if avoid_current_release:
-                display_filtered_df = display_filtered_df[display_filtered_df['Release'].astype(str) != str(current_release)]
-
-        for track in track_types:
-            track_df = display_filtered_df[display_filtered_df['Track No#'] == track]
-            
-            col1, col2 = st.columns([3, 1])
+
+        slots = st.container()
+        total_box = st.empty()
+        export_box = st.empty()
+        with slots:
+            for track in track_types:
+                manual_slot(track, display_filtered_df, total_box, export_box)
+        render_custom_summary(display_filtered_df, total_box, export_box)
+        render_save_buttons('custom_playlist', "custom")
+
+# ---------- Tab 4: My Playlists ----------
+with tab4, perf.span("tab4"):
+    st.markdown("### 📦 Plan a batch of classes")
+    st.markdown("Build several playlists at once with your Step 1 and fine-tune settings. "
+                "Tracks are spread across the batch so they repeat as little as possible.")
+    col1, col2 = st.columns(2)
+    with col1:
+        batch_size = st.number_input("Number of classes", min_value=2, max_value=52, value=12, key="batch_size")
+    with col2:
+        batch_theme = st.checkbox("Use my Theme tab filters", key="batch_theme")
+    if st.button("📦 Build batch", key="build_batch"):
+        with perf.span("tab4.batch"):
+            batch_window = filter_release_window(df, early_release, use_recent, avoid_current_release, current_release)
+            if batch_theme:
+                batch_window = batch_window[theme_rows]
+            batch_window = without_recently_taught(batch_window)
+            st.session_state['batch_playlists'] = [
+                (f"Class {n}", playlist)
+                for n, playlist in enumerate(build_playlist_batch(
+                    batch_window, batch_size, mix_preferences, theme=batch_theme), start=1)
+            ]
+    batch = st.session_state.get('batch_playlists')
+    if batch:
+        st.markdown(f"**{len(batch)} playlists ready.** Download them all in one file:")
+        playlist_downloads(batch, "pump-class-batch", "batch")
+        preview = lazy_expander("Preview", "batch_preview")
+        if preview.open:
+            with preview:
+                st.code(export_text(batch), language=None)
+
+    st.markdown("### 📚 Saved playlists")
+    st.markdown("Playlists you marked as taught or saved to favorites. "
+                "Bookmark this page to keep them: the link includes your profile.")
+    history_filter = st.radio("Show", ["All", "⭐ Favorites"], horizontal=True, key="history_filter")
+    # Cached in the store until this profile saves again; the catalog joins
+    # and texts below are only built for an open playlist or a download
+    saved_playlists = store.playlists(profile, favorites_only=history_filter != "All")
+    saved_titles = []
+    for saved in saved_playlists:
+        title = f"{saved['method'].title()} playlist, " \
+                f"saved {time.strftime('%b %d, %Y', time.localtime(saved['created_at']))}"
+        if saved['taught_at']:
+            title += f" · taught {time.strftime('%b %d', time.localtime(saved['taught_at']))}"
+        saved_titles.append(title)
+    if saved_playlists:
+        st.markdown("Download every playlist shown:")
+        playlist_downloads(lambda: [(title, saved_playlist_df(saved))
+                                    for title, saved in zip(saved_titles, saved_playlists)],
+                           "pump-saved-playlists", "history")
+    else:
+        st.info("Nothing saved yet. Use ✅ I taught this today or ⭐ Save to favorites under a playlist.")
+    for saved, title in zip(saved_playlists, saved_titles):
+        history_entry = lazy_expander(f"{'⭐ ' if saved['favorite'] else ''}{title}", f"history_open_{saved['id']}")
+        if not history_entry.open:
+            continue
+        with history_entry:
+            st.code(export_text([(title, saved_playlist_df(saved))]), language=None)
+            col1, col2, col3 = st.columns(3)
             with col1:
-                if not track_df.empty:
-                    display_names = [f"[{row['Release']}] {row['Song Title']} by {row['Artist']}" for _, row in track_df.iterrows()]
-                    
-                    # Determine current selection index
-                    current_selection = 0
-                    
-                    # Check if there's a forced reset (from clear button)
-                    reset_key = f"reset_{track}"
-                    if reset_key in st.session_state and st.session_state[reset_key]:
-                        current_selection = 0
-                        st.session_state[reset_key] = False  # Reset the flag
-                    elif track in st.session_state.get('manual_selection', {}):
-                        # Try to find the current selection in the dropdown
-                        selected_row = st.session_state['manual_selection'][track]
-                        try:
-                            for i, (_, row) in enumerate(track_df.iterrows()):
-                                if (row['Song Title'] == selected_row['Song Title'] and 
-                                    row['Artist'] == selected_row['Artist'] and 
-                                    str(row['Release']) == str(selected_row['Release'])):
-                                    current_selection = i
-                                    break
-                        except:
-                            current_selection = 0
-                    
-                    selected_idx = st.selectbox(
-                        track, 
-                        range(len(display_names)),
-                        format_func=lambda x: display_names[x],
-                        index=current_selection,
-                        key=f"manual_{track}"
-                    )
-                    
-                    # Update session state with the selected track
-                    chosen_row = track_df.iloc[selected_idx]
-                    st.session_state['manual_selection'][track] = chosen_row
-                else:
-                    st.selectbox(track, ["⚠️ No tracks available"], key=f"manual_{track}")
-                    st.session_state['manual_selection'][track] = pd.Series({
-                        "Track No#": track, "Song Title": "⚠️ No match found", "Artist": "-",
-                        "Release": "-", "Duration": "-", "Genre": "-", "Tags": "-"
-                    })
-            
+                st.button("☆ Unfavorite" if saved['favorite'] else "⭐ Favorite", key=f"history_favorite_{saved['id']}",
+                          on_click=toggle_favorite, args=(saved['id'], not saved['favorite']))
             with col2:
-                # Clear selection button
-                if st.button("🗑️", key=f"clear_{track}", help=f"Reset to first option"):
-                    # Set flag to reset this track's selection
-                    st.session_state[f"reset_{track}"] = True
-                    st.rerun()
-
-        # Build final playlist from session state
-        manual_selection = st.session_state.get('manual_selection', {})
-        playlist_rows = []
-        for track in track_types:
-            if track in manual_selection:
-                playlist_rows.append(manual_selection[track])
-            else:
-                # Default to first available track or empty
-                track_df = display_filtered_df[display_filtered_df['Track No#'] == track]
-                if not track_df.empty:
-                    playlist_rows.append(track_df.iloc[0])
-                else:
-                    playlist_rows.append(pd.Series({
-                        "Track No#": track, "Song Title": "⚠️ No match found", "Artist": "-",
-                        "Release": "-", "Duration": "-", "Genre": "-", "Tags": "-"
-                    }))
-
-        playlist_df = pd.DataFrame(playlist_rows)
-        st.session_state['custom_playlist'] = playlist_df
-        
-        # Show playlist summary and export
-        total_sec = playlist_df['Duration'].apply(duration_to_sec).sum()
-        min_, sec = divmod(total_sec, 60)
-        st.markdown(f"**🕒 Total Duration: {min_}:{str(sec).zfill(2)}**")
-        
-        playlist_copy_export(playlist_df)
+                st.button("✅ Taught today", key=f"history_taught_{saved['id']}",
+                          on_click=mark_playlist_taught, args=(saved['id'],))
+            with col3:
+                st.button("🗑️ Delete", key=f"history_delete_{saved['id']}",
+                          on_click=delete_saved_playlist, args=(saved['id'],))
 
 # ---------------- Footer ----------------
 st.markdown("---")
@@ -768,3 +865,34 @@ st.markdown("""
         <a href="https://github.com/jmisener123/pump-playlist-builder/" target="_blank" style="color:#2563eb; font-size:0.8rem; text-decoration:underline;">GitHub</a>
     </div>
 """, unsafe_allow_html=True)
+
+# ---------------- Perf panel ----------------
+if show_perf_panel:
+    with st.sidebar:
+        st.markdown("### ⏱️ Rerun timings")
+        st.caption(f"Run {perf.run} of session {perf.session}")
+        spans = perf.summary()["spans"]
+        st.dataframe(
+            pd.DataFrame(
+                [(name, s["ms"], s["count"]) for name, s in spans.items()],
+                columns=["Span", "ms", "Count"],
+            ).sort_values("ms", ascending=False),
+            hide_index=True,
+        )
+        st.markdown(f"**Script total: {perf.total() * 1000:.1f} ms**")
+
+        # Data problems found when this catalog was built (catalog_validation.py)
+        st.markdown("### 🩺 Catalog check")
+        st.caption(summary_line(catalog.report))
+        st.dataframe(
+            pd.DataFrame(
+                [(name, check["count"], ", ".join(check["values"]))
+                 for name, check in catalog.report["checks"].items()],
+                columns=["Check", "Rows", "Values"],
+            ),
+            hide_index=True,
+        )
+        with st.expander("Example rows"):
+            st.json({name: check["examples"] for name, check in catalog.report["checks"].items()
+                     if check["count"]}, expanded=False)
+perf.finish()
@@ -0,0 +1,217 @@
+"""
+PlaylistService.handle() on a small synthetic catalog, plus the HTTP layer's
+request parsing. Run from the repo root:
+
+    python -m pytest tests
+"""
+
+import asyncio
+import json
+import re
+from http import HTTPStatus
+
+import pytest
+
+from benchmarks.synthetic import generate_catalog, to_encoded_csv
+from catalog_loader import prepare_catalog
+import playlist_api
+from playlist_api import PlaylistService, start_api
+from playlist_engine import track_types
+
+
+@pytest.fixture(scope="module")
+def service():
+    return PlaylistService(prepare_catalog(to_encoded_csv(generate_catalog(0.5, seed=1))))
+
+
+def call(service, method, target, body=None):
+    status, payload = service.handle(method, target, b"" if body is None else json.dumps(body).encode())
+    return status, json.loads(payload)
+
+
+def track_ids(playlist):
+    return [track["TrackID"] for track in playlist["tracks"]]
+
+
+# -------- Routing --------
+def test_catalog(service):
+    status, info = call(service, "GET", "/catalog")
+    assert status == HTTPStatus.OK
+    assert info["current_release"] in info["releases"]
+    assert info["track_types"] == track_types
+
+
+def test_unknown_path_and_method(service):
+    assert call(service, "GET", "/nope")[0] == HTTPStatus.NOT_FOUND
+    assert call(service, "POST", "/catalog")[0] == HTTPStatus.METHOD_NOT_ALLOWED
+
+
+def test_search_tracks_have_the_playlist_track_shape(service):
+    status, result = call(service, "GET", "/search?q=love&limit=3")
+    assert status == HTTPStatus.OK
+    assert 0 < len(result["tracks"]) <= 3
+    _, playlists = call(service, "GET", "/playlist/random?seed=1")
+    assert all(track.keys() == playlists[0]["tracks"][0].keys() for track in result["tracks"])
+
+
+# -------- Playlists --------
+def test_random_playlist_is_reproducible_with_a_seed(service):
+    status, playlists = call(service, "GET", "/playlist/random?seed=7")
+    assert status == HTTPStatus.OK
+    assert len(playlists) == 1
+    assert [track["Track No#"] for track in playlists[0]["tracks"]] == track_types
+    assert call(service, "GET", "/playlist/random?seed=7")[1] == playlists
+
+
+def test_random_batch(service):
+    status, playlists = call(service, "GET", "/playlist/random?count=3&seed=1")
+    assert status == HTTPStatus.OK
+    assert [playlist["name"] for playlist in playlists] == ["Random 1", "Random 2", "Random 3"]
+
+
+def test_track_ids_are_exact_as_json_numbers(service):
+    _, playlists = call(service, "GET", "/playlist/random?seed=3")
+    ids = [track_id for track_id in track_ids(playlists[0]) if track_id is not None]
+    assert ids and all(isinstance(track_id, int) for track_id in ids)
+    # A JavaScript client holds them as float64
+    assert all(int(float(track_id)) == track_id for track_id in ids)
+
+
+def test_theme_playlist_rejects_unknown_tags(service):
+    status, error = call(service, "GET", "/playlist/theme?tags=Nope")
+    assert status == HTTPStatus.BAD_REQUEST
+    assert "Nope" in error["error"]
+
+
+def test_duration_playlist(service):
+    status, playlists = call(service, "GET", "/playlist/duration?target=55:00&seed=2")
+    assert status == HTTPStatus.OK
+    minutes, seconds = map(int, playlists[0]["total_duration"].split(":"))
+    assert abs(minutes * 60 + seconds - 55 * 60) <= 120
+
+
+# -------- Parameter checks --------
+@pytest.mark.parametrize("query, message", [
+    ("recency=nan", "recency must be a finite number"),
+    ("recency=inf", "recency must be a finite number"),
+    ("recency=9", "recency must be between -3.0 and 3.0"),
+    ("seed=-1", "seed must be at least 0"),
+    ("seed=abc", "seed must be a number"),
+    ("count=0", "count must be between 1 and 20"),
+    ("early_release=nope", "unknown early_release 'nope'"),
+])
+def test_bad_parameters(service, query, message):
+    status, error = call(service, "GET", f"/playlist/random?{query}")
+    assert status == HTTPStatus.BAD_REQUEST
+    assert error["error"] == message
+
+
+@pytest.mark.parametrize("target, message", [
+    ("0", "target must be more than 0 seconds"),
+    ("-300", "target must be more than 0 seconds"),
+    ("0:00", "target must be more than 0 seconds"),
+    ("5:-3", "target must be M:SS or seconds"),
+    ("5:75", "target must be M:SS or seconds"),
+    ("1:2:3", "target must be M:SS or seconds"),
+])
+def test_bad_duration_targets(service, target, message):
+    status, error = call(service, "GET", f"/playlist/duration?target={target}")
+    assert status == HTTPStatus.BAD_REQUEST
+    assert error["error"] == message
+
+
+# -------- Swap --------
+def test_swap_replaces_only_the_slot(service):
+    _, playlists = call(service, "GET", "/playlist/random?seed=5")
+    ids = track_ids(playlists[0])
+    status, swapped = call(service, "POST", "/playlist/swap?seed=1", {"tracks": ids, "slot": 3, "mode": "similar"})
+    assert status == HTTPStatus.OK
+    new_ids = track_ids(swapped[0])
+    assert new_ids[:3] + new_ids[4:] == ids[:3] + ids[4:]
+    assert new_ids[3] != ids[3]
+
+
+def test_swap_by_track_name(service):
+    _, playlists = call(service, "GET", "/playlist/random?seed=5")
+    status, _ = call(service, "POST", "/playlist/swap", {"tracks": track_ids(playlists[0]), "slot": "4 - Back"})
+    assert status == HTTPStatus.OK
+
+
+@pytest.mark.parametrize("change", [
+    {"slot": True},
+    {"slot": 10},
+    {"mode": "other"},
+    {"tracks": [True] * len(track_types)},
+    {"tracks": [1] * 3},
+])
+def test_swap_rejects_bad_bodies(service, change):
+    _, playlists = call(service, "GET", "/playlist/random?seed=5")
+    body = {"tracks": track_ids(playlists[0]), "slot": 0, **change}
+    assert call(service, "POST", "/playlist/swap", body)[0] == HTTPStatus.BAD_REQUEST
+
+
+def test_swap_rejects_a_track_in_the_wrong_slot(service):
+    _, playlists = call(service, "GET", "/playlist/random?seed=5")
+    ids = track_ids(playlists[0])
+    ids[0], ids[1] = ids[1], ids[0]
+    status, error = call(service, "POST", "/playlist/swap", {"tracks": ids, "slot": 2})
+    assert status == HTTPStatus.BAD_REQUEST
+    assert "1 - Warmup" in error["error"]
+
+
+# -------- HTTP --------
+async def _exchange(service, raw, responses=1):
+    """Write raw to a fresh server; return the first `responses` (head, body) pairs it sends back."""
+    server = await start_api(service, port=0, workers=1)
+    try:
+        reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+        writer.write(raw)
+        await writer.drain()
+        replies = []
+        for _ in range(responses):
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 10)
+            length = int(re.search(rb"Content-Length: (\d+)", head).group(1))
+            replies.append((head, await reader.readexactly(length)))
+        writer.close()
+        return replies
+    finally:
+        server.close()
+        await server.wait_closed()
+        server.executor.shutdown()
+
+
+@pytest.mark.parametrize("length", ["abc", "-5"])
+def test_bad_content_length_gets_400(service, length):
+    [(head, body)] = asyncio.run(_exchange(
+        service, f"POST /playlist/swap HTTP/1.1\r\nContent-Length: {length}\r\n\r\n{{}}".encode()))
+    assert head.startswith(b"HTTP/1.1 400 ")
+    assert b"Content-Length" in body
+
+
+def test_keep_alive_answers_pipelined_requests(service):
+    request = b"GET /catalog HTTP/1.1\r\nHost: localhost\r\n\r\n"
+    replies = asyncio.run(_exchange(service, request * 2, responses=2))
+    for head, body in replies:
+        assert head.startswith(b"HTTP/1.1 200 ")
+        assert b"Connection: keep-alive" in head
+        assert json.loads(body)["track_types"] == track_types
+
+
+def test_slow_request_is_dropped(service, monkeypatch):
+    monkeypatch.setattr(playlist_api, "REQUEST_TIMEOUT", 0.2)
+
+    async def trickle():
+        server = await start_api(service, port=0, workers=1)
+        try:
+            reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+            writer.write(b"GET /catalog HTTP/1.1\r\n")  # headers never finish
+            await writer.drain()
+            closed = await asyncio.wait_for(reader.read(), 5)
+            writer.close()
+            return closed
+        finally:
+            server.close()
+            await server.wait_closed()
+            server.executor.shutdown()
+
+    assert asyncio.run(trickle()) == b""
@@ -0,0 +1,104 @@
+"""
+The slot allocator behind the Random and Theme generators and the catalog's
+TrackIDs, on small hand-built catalogs. Run from the repo root:
+
+    python -m pytest tests
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import playlist_engine
+from playlist_engine import assemble_playlist, build_random_playlist, song_keys, track_ids, track_types
+
+
+def catalog(rows):
+    """Catalog frame from (slot, title, artist) rows, with the columns the generators read."""
+    df = pd.DataFrame(rows, columns=["Track No#", "Song Title", "Artist"])
+    df["Release"] = "100"
+    df["SortKey"] = 100.0
+    df["Duration"] = "5:00"
+    df["Genre"] = "Pop"
+    df["Tags"] = None
+    df["SongKey"] = song_keys(df["Song Title"], df["Artist"])
+    df["TrackID"] = track_ids(df)
+    return df
+
+
+def filled(playlist):
+    return playlist[playlist["TrackID"].notna()]
+
+
+# -------- Allocator --------
+@pytest.mark.parametrize("seed", range(5))
+def test_no_song_repeats_across_slots(seed):
+    # Every slot offers the same songs, so independent draws would collide
+    songs = [f"Song {i}" for i in range(len(track_types))]
+    df = catalog([(track, song, "Artist") for track in track_types for song in songs])
+    playlist = build_random_playlist(df, rng=np.random.default_rng(seed))
+    assert len(filled(playlist)) == len(track_types)
+    assert playlist["SongKey"].is_unique
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_scarce_slot_keeps_its_only_candidate(seed):
+    # The second slot can only play "Only One"; the first, filled earlier in
+    # slot order, could play it too
+    broad, scarce = track_types[:2]
+    rows = [(scarce, "Only One", "Artist")]
+    rows += [(broad, "Only One", "Artist")] + [(broad, f"Broad {i}", "Artist") for i in range(20)]
+    rows += [(track, f"{track} song", "Artist") for track in track_types[2:]]
+    df = catalog(rows)
+    playlist = build_random_playlist(df, rng=np.random.default_rng(seed)).set_index("Track No#")
+    assert playlist.loc[scarce, "Song Title"] == "Only One"
+    assert playlist.loc[broad, "Song Title"].startswith("Broad")
+
+
+def test_greedy_fill_when_the_search_budget_runs_out(monkeypatch):
+    monkeypatch.setattr(playlist_engine, "ALLOCATOR_BUDGET", 0)
+    songs = [f"Song {i}" for i in range(len(track_types))]
+    df = catalog([(track, song, "Artist") for track in track_types for song in songs])
+    playlist = build_random_playlist(df, rng=np.random.default_rng(0))
+    assert len(filled(playlist)) == len(track_types)
+    assert playlist["SongKey"].is_unique
+
+
+def test_unsatisfiable_slots_get_a_placeholder():
+    # Two slots whose only song is the same: one plays it, the other is empty
+    rows = [(track, "Shared", "Artist") for track in track_types[:2]]
+    rows += [(track, f"{track} song", "Artist") for track in track_types[2:]]
+    playlist = build_random_playlist(catalog(rows), rng=np.random.default_rng(0))
+    assert len(filled(playlist)) == len(track_types) - 1
+    assert (playlist["Song Title"] == "Shared").sum() == 1
+    assert (playlist["Song Title"] == "⚠️ No match found").sum() == 1
+
+
+# -------- TrackIDs --------
+def test_track_ids_are_stable_and_unique_with_duplicate_rows():
+    rows = [(track, f"{track} song", "Artist") for track in track_types]
+    df = catalog(rows + rows[:3] + rows[:1])  # the sheet sometimes repeats rows
+    ids = track_ids(df)
+    assert ids.is_unique
+    assert ids.equals(track_ids(df.copy()))
+    assert (ids < 2 ** playlist_engine.TRACK_ID_BITS).all()
+    # Reordering the sheet hands out the same IDs (copies of a row swap theirs)
+    assert sorted(track_ids(df.iloc[::-1])) == sorted(ids)
+
+
+def test_colliding_track_ids_are_moved_apart(monkeypatch):
+    monkeypatch.setattr(playlist_engine, "TRACK_ID_BITS", 6)
+    df = catalog([(track_types[0], f"Song {i}", "Artist") for i in range(40)])
+    ids = track_ids(df)
+    assert ids.is_unique
+    assert (ids < 2 ** 6).all()
+    assert track_ids(df.sample(frac=1, random_state=0)).sort_index().equals(ids)
+
+
+def test_placeholder_rows_keep_exact_int64_track_ids():
+    df = catalog([(track, f"{track} song", "Artist") for track in track_types])
+    picks = {track: pos for pos, track in enumerate(track_types) if track != track_types[1]}
+    playlist = assemble_playlist(df, picks)
+    assert playlist["TrackID"].dtype == "Int64"
+    assert playlist["TrackID"].isna().tolist() == [track == track_types[1] for track in track_types]
+    assert filled(playlist)["TrackID"].tolist() == df["TrackID"].drop(index=1).tolist()
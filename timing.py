@@ -0,0 +1,126 @@
+"""
+Named timing spans for one run of the Streamlit script.
+
+    timer = RerunTimer(enabled=True)
+    with timer.span("load_data"):
+        df = load_data(encoded_csv)
+    timer.finish()   # logs one JSON line with every span
+
+When disabled, span() hands back a shared no-op context manager, so leaving
+the spans in place costs one attribute check each.
+"""
+
+import contextlib
+import json
+import logging
+import os
+import sys
+import time
+
+logger = logging.getLogger("pumpplaylist.perf")
+
+# Set PUMP_PERF_LOG=1 in the deployment to get one JSON log line per rerun
+LOG_ENV_VAR = "PUMP_PERF_LOG"
+
+_NOOP = contextlib.nullcontext()
+
+
+def log_enabled():
+    return os.environ.get(LOG_ENV_VAR, "").lower() in ("1", "true", "yes")
+
+
+def configure_logging():
+    """Send perf lines to stdout as bare JSON, once per process."""
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+
+class _Span:
+    __slots__ = ("timer", "name", "start")
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+@contextlib.contextmanager
+def _fragment_run(timer, name):
+    with timer.span(name):
+        yield
+    timer.finish(ended_by="fragment")
+
+
+class RerunTimer:
+    """Collects spans for one script run; repeated names are summed."""
+
+    def __init__(self, enabled=False, log=False, session=None, run=0):
+        self.enabled = enabled or log
+        self.log = log
+        self.session = session
+        self.run = run
+        self.start = time.perf_counter()
+        self.spans = {}  # name -> [total seconds, count]
+        self.finished = False
+
+    def span(self, name):
+        if not self.enabled:
+            return _NOOP
+        return _Span(self, name)
+
+    def fragment(self, name, rerun, pending=()):
+        """Span for the body of an st.fragment.
+
+        In a full run this is a normal span. When the fragment reruns on its
+        own (`rerun`), the full run's timer belongs to a run that is over, so
+        the fragment gets a timer of its own (seeded with any `pending`
+        (name, seconds) spans) that is logged when the body exits.
+        """
+        if not self.enabled:
+            return _NOOP
+        if not rerun:
+            return _Span(self, name)
+        timer = RerunTimer(enabled=True, log=self.log, session=self.session, run=self.run)
+        for pending_name, seconds in pending:
+            timer.record(pending_name, seconds)
+        return _fragment_run(timer, name)
+
+    def record(self, name, seconds):
+        entry = self.spans.setdefault(name, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+    def total(self):
+        return time.perf_counter() - self.start
+
+    def summary(self, ended_by="end"):
+        return {
+            "event": "rerun",
+            "session": self.session,
+            "run": self.run,
+            "ended_by": ended_by,
+            "total_ms": round(self.total() * 1000, 2),
+            "spans": {
+                name: {"ms": round(seconds * 1000, 2), "count": count}
+                for name, (seconds, count) in self.spans.items()
+            },
+        }
+
+    def finish(self, ended_by="end"):
+        """Log this run once. ended_by says how it ended, e.g. "fragment"."""
+        if self.finished:
+            return
+        self.finished = True
+        if self.log:
+            logger.info(json.dumps(self.summary(ended_by), ensure_ascii=False))